@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+    Compare the list mode and the array-backed (NumPy) mode of the maps.
+
+    Usage: python3 benchmark_map_storage.py [--map example3.pgm] [--size 4096]
+"""
+import contextlib
+import io
+import random
+import time
+
+from geometry import vector
+from map import map_base, raw_map, area_map
+
+
+@contextlib.contextmanager
+def timer(name, results):
+    """ measure the time needed for the block """
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def benchmark_storage(width, height, data):
+    """ benchmark per tile and bulk access on a map with the given storage """
+    results = {}
+    base_map = map_base.MapBase(width, height, data)
+
+    # random coordinates (the same for both modes)
+    rng = random.Random(42)
+    count = min(width * height, 1000000)
+    xs = [rng.randrange(width) for _ in range(count)]
+    ys = [rng.randrange(height) for _ in range(count)]
+    tiles = [vector.GridTile(x, y) for x, y in zip(xs, ys)]
+
+    with timer("per tile get", results):
+        for tile in tiles:
+            base_map[tile]
+
+    with timer("per tile set", results):
+        for tile in tiles:
+            base_map[tile] = 1
+
+    with timer("bulk get", results):
+        base_map.get_values(xs, ys)
+
+    with timer("bulk set", results):
+        base_map.set_values(xs, ys, 2)
+
+    with timer("row sweep", results):
+        for y in range(height):
+            row = base_map.get_row(y)
+            base_map.set_row(y, 0, row)
+
+    with timer("masked assignment", results):
+        mask = [v == 2 for v in base_map.data] if not base_map.is_array_backed() else base_map.data == 2
+        base_map.assign_where(mask, 3)
+
+    return results
+
+
+def benchmark_area_map(path, array_backed):
+    """ benchmark the creation of the area and influence map """
+    results = {}
+    rmap = raw_map.RawMap.read(path)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        with timer("area map", results):
+            amap = area_map.AreaMap(rmap, lambda x: x == 255, array_backed=array_backed)
+
+    with timer("full tile scan", results):
+        for tile in amap.tiles_iterator():
+            amap[tile]
+
+    with timer("row scan", results):
+        for y in range(amap.height):
+            amap.get_row(y)
+
+    return results
+
+
+def print_results(title, results_by_mode):
+    """ print the results of the modes side by side """
+    print(title)
+    modes = list(results_by_mode)
+    print("    %-20s" % "" + "".join("%14s" % mode for mode in modes))
+    for name in results_by_mode[modes[0]]:
+        times = "".join("%13.4fs" % results_by_mode[mode][name] for mode in modes)
+        print("    %-20s%s" % (name, times))
+
+
+def main():
+    import argparse
+
+    # create parser
+    parser = argparse.ArgumentParser(prog='benchmark_map_storage')
+    parser.add_argument("--map", default="example3.pgm")
+    parser.add_argument("--size", type=int, default=4096)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    numpy = map_base.numpy
+    if numpy is None:
+        print("NumPy is not available, only the list mode is measured.")
+
+    # real map
+    results = {"list": benchmark_area_map(args.map, False)}
+    if numpy is not None:
+        results["array"] = benchmark_area_map(args.map, True)
+    print_results("%s:" % args.map, results)
+
+    # synthetic map
+    size = args.size
+    results = {"list": benchmark_storage(size, size, [0] * (size * size))}
+    if numpy is not None:
+        results["array"] = benchmark_storage(size, size, numpy.zeros((size, size), dtype=numpy.int32))
+    print_results("synthetic %dx%d map:" % (size, size), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,9 @@
+import array
+import collections
+import collections.abc
+import itertools
+
+
 class Vector:
     """
 		This class represents a general vector, independent of its purpose.
@@ -401,6 +407,152 @@ class PathF(PathTemplate):
     pass
 
 
+class DequePathF(PathF):
+    """
+		Represents a path in the plane whose points are stored in a deque,
+		hence points can be added and removed at both ends in constant time.
+		Used for the working copies of paths (e.g. in the path optimisation).
+	"""
+
+    def __init__(self, points=None):
+        # points is a deque of points
+        self.points = collections.deque(points if points else ())
+
+    def pop_first(self):
+        """ remove the first element of the points and return it """
+        return self.points.popleft()
+
+    def prepend(self, p):
+        """ prepend p to the start """
+        return self.points.appendleft(p)
+
+    def get_path_extended_by(self, p):
+        """ create a new list with the point added to the end """
+        return self.__class__(itertools.chain(self.points, [p]))
+
+    def length(self):
+        """ returns the length of the path (indexing a deque is slow, hence iterate) """
+        it = iter(self.points)
+        previous = next(it, None)
+        length = 0
+        for p in it:
+            length += (p - previous).length()
+            previous = p
+        return length
+
+    def toPathF(self):
+        return PathF(list(self.points))
+
+
+class CompactPathF(PathF):
+    """
+		Represents an immutable path in the plane whose coordinates are stored
+		in a flat array of doubles (x0, y0, x1, y1, ...). points is a read-only
+		view on the array, the length is cached and the reversed path is a view
+		on the same array. Used for the stored optimal paths (e.g. of the graph edges).
+	"""
+
+    def __init__(self, points=None):
+        coordinates = array.array("d")
+        for p in points if points else ():
+            coordinates.append(p.x)
+            coordinates.append(p.y)
+        self._coordinates = coordinates
+        self._is_reversed = False
+        self._length = None
+
+    @property
+    def points(self):
+        """ read-only view on the points (which are created on access) """
+        return CompactPoints(self._coordinates, self._is_reversed)
+
+    def node_count(self):
+        """ length of the points """
+        return len(self._coordinates) // 2
+
+    def pop_first(self):
+        raise TypeError("%s is immutable" % self.__class__.__name__)
+
+    def append(self, p):
+        raise TypeError("%s is immutable" % self.__class__.__name__)
+
+    def prepend(self, p):
+        raise TypeError("%s is immutable" % self.__class__.__name__)
+
+    def get_path_extended_by(self, p):
+        """ create a new path with the point added to the end """
+        return self.__class__(itertools.chain(self.points, [p]))
+
+    def reversed(self):
+        """ returns the reversed path, it shares the coordinates (and the length) with self """
+        path = self.__class__.__new__(self.__class__)
+        path._coordinates = self._coordinates
+        path._is_reversed = not self._is_reversed
+        path._length = self.length()
+        return path
+
+    def length(self):
+        """ returns the length of the path (it is computed once) """
+        if self._length is None:
+            c = self._coordinates
+            self._length = sum(
+                ((c[i + 2] - c[i]) * (c[i + 2] - c[i]) + (c[i + 3] - c[i + 1]) * (c[i + 3] - c[i + 1])) ** 0.5
+                for i in range(0, len(c) - 2, 2)
+            )
+        return self._length
+
+    def toPathF(self):
+        return PathF(list(self.points))
+
+
+class CompactPoints(collections.abc.Sequence):
+    """
+		Read-only sequence of the points of a CompactPathF,
+		indexing with a slice returns a list of points.
+	"""
+
+    __slots__ = ("_coordinates", "_is_reversed")
+
+    def __init__(self, coordinates, is_reversed):
+        self._coordinates = coordinates
+        self._is_reversed = is_reversed
+
+    def __len__(self):
+        return len(self._coordinates) // 2
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("point index out of range")
+        if self._is_reversed:
+            index = n - 1 - index
+        return PointF(self._coordinates[2 * index], self._coordinates[2 * index + 1])
+
+    def __iter__(self):
+        c = self._coordinates
+        indices = range(len(c) - 2, -1, -2) if self._is_reversed else range(0, len(c), 2)
+        for i in indices:
+            yield PointF(c[i], c[i + 1])
+
+    def __reversed__(self):
+        return iter(CompactPoints(self._coordinates, not self._is_reversed))
+
+    def __add__(self, other):
+        """ concatenation gives a list (like for the points of PathF) """
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class Polygon(PathF):
     """
 		Represents a polygon in the plane.
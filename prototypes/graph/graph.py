@@ -1,6 +1,7 @@
 import collections
 
 from geometry import vector
+import pf_parallel
 
 
 class Graph:
@@ -8,10 +9,15 @@ class Graph:
 		Represents a graph.
 	"""
 
-    def __init__(self, area_map, influence_map):
+    def __init__(self, area_map, influence_map, workers=1):
+        """
+            the edge paths are optimised by the given number of worker processes
+            (None means one per CPU, see pf_parallel)
+        """
         # set area and influence map
         self.area_map = area_map
         self.influence_map = influence_map
+        self.workers = workers
 
         # initialise attributes
         self.nodes = []
@@ -23,10 +29,58 @@ class Graph:
         # create the graph
         self._create_graph()
 
+    def __getstate__(self):
+        """
+            pickle the nodes and edges in a flat form (nodes and edges are
+            replaced by their index), otherwise pickle recurses along the graph
+        """
+        state = dict(self.__dict__)
+
+        nodes = []
+        for node in self.nodes:
+            node_state = dict(node.__dict__)
+            node_state['edges'] = [edge.edge_id for edge in node.edges]
+            nodes.append(node_state)
+
+        edges = []
+        for edge in self.edges:
+            edge_state = dict(edge.__dict__)
+            edge_state['_node_a'] = edge.node_a.node_id
+            edge_state['_node_b'] = edge.node_b.node_id
+            edges.append(edge_state)
+
+        state['nodes'] = nodes
+        state['edges'] = edges
+        state['_node_positions'] = None
+        return state
+
+    def __setstate__(self, state):
+        """ restore the nodes and edges from the flat form """
+        self.__dict__.update(state)
+
+        self.nodes = []
+        for node_state in state['nodes']:
+            node = GraphNode.__new__(GraphNode)
+            node.__dict__.update(node_state)
+            self.nodes.append(node)
+
+        self.edges = []
+        for edge_state in state['edges']:
+            edge = GraphEdge.__new__(GraphEdge)
+            edge.__dict__.update(edge_state)
+            edge._node_a = self.nodes[edge._node_a]
+            edge._node_b = self.nodes[edge._node_b]
+            self.edges.append(edge)
+
+        for node in self.nodes:
+            node.edges = [self.edges[i] for i in node.edges]
+
+        self._node_positions = {node.position: node for node in self.nodes}
+
     def _add_node(self, position):
         """ add a node to the graph """
-        # create the node
-        node = GraphNode(position)
+        # create the node (its id is its index in the list of nodes)
+        node = GraphNode(position, len(self.nodes))
         # add it the list of nodes
         self.nodes.append(node)
         # add it to dictionary position -> node
@@ -41,8 +95,8 @@ class Graph:
         for edge in node_a.edges:
             if path.directionless_compare(edge._path):
                 return
-        # create the edge
-        edge = GraphEdge(node_a, node_b, path)
+        # create the edge (its id is its index in the list of edges)
+        edge = GraphEdge(node_a, node_b, path, len(self.edges))
         # add it the list of edges
         self.edges.append(edge)
         # announce the existence of the edge (only add once per node)
@@ -164,19 +218,38 @@ class Graph:
 			optimise every path between nodes and hence initialises
 			GraphEdge.opt_path and GraphEdge.opt_path_length
 		"""
-        for edge in self.edges:
-            path = edge._path.toPathF()
-            opt_path = self.area_map.optimise_path(path)
+        paths = [edge._path.toPathF() for edge in self.edges]
+
+        workers = pf_parallel.worker_count(self.workers)
+        if workers > 1:
+            # create the indices of the area map before the workers are forked
+            self.area_map.create_indices()
+            # several chunks per worker balance the load
+            chunks = pf_parallel.split_into_chunks(paths, 4 * workers)
+            opt_paths = pf_parallel.map_chunks(_optimise_paths, self.area_map, chunks, workers)
+            opt_paths = [opt_path for chunk in opt_paths for opt_path in chunk]
+        else:
+            opt_paths = _optimise_paths(self.area_map, paths)
+
+        # the results are in the order of the edges
+        for edge, opt_path in zip(self.edges, opt_paths):
             edge.set_optimal_path(opt_path)
 
 
+def _optimise_paths(area_map, paths):
+    """ optimise the paths (see Graph._optimise_edge_paths) """
+    return [area_map.optimise_path(path) for path in paths]
+
+
 class GraphNode:
     """
 		Represents a node in the graph.
 	"""
 
-    def __init__(self, position):
+    def __init__(self, position, node_id):
         self.position = position
+        # dense integer id, i.e. the index in Graph.nodes
+        self.node_id = node_id
         self.edges = []
 
         # slots for results of deferred calculations
@@ -229,11 +302,13 @@ class GraphEdge:
 		Represents an edge in the graph.
 	"""
 
-    def __init__(self, node_a, node_b, path):
+    def __init__(self, node_a, node_b, path, edge_id):
         # save the path
         self._node_a = node_a
         self._node_b = node_b
         self._path = path
+        # dense integer id, i.e. the index in Graph.edges
+        self.edge_id = edge_id
 
         # slots for results of deferred calculations
         self._node_a_gates = []  # init by Graph._find_gates
@@ -257,10 +332,6 @@ class GraphEdge:
         """ return the nodes which are associated to the edge """
         return {self.node_a, self.node_b}
 
-    def edge_id(self, graph):
-        """ in C++ this should be replaced by just the pointer """
-        return graph.edges.index(self)
-
     def add_a_gate(self, gate_point):
         """ add the point to the _node_a_gates list """
         self._node_a_gates.append(gate_point)
@@ -270,8 +341,8 @@ class GraphEdge:
         self._node_b_gates.append(gate_point)
 
     def set_optimal_path(self, opt_path):
-        """ set the optimal path between node a and node b"""
-        self._opt_path = opt_path
+        """ set the optimal path between node a and node b (it is stored compactly) """
+        self._opt_path = vector.CompactPathF(opt_path.points)
         self._opt_path_length = self._opt_path.length()
 
     # def set_optimal_gate_path(self, opt_gate_path):
@@ -303,6 +374,11 @@ class DirectionalGraphEdge:
         self._graph_edge = graph_edge
         self._a_to_b = a_to_b
 
+    @property
+    def edge_id(self):
+        """ the id of the underlying graph edge """
+        return self._graph_edge.edge_id
+
     def path(self):
         """ get the path """
         if self._a_to_b:
@@ -365,8 +441,9 @@ class DirectionalGraphEdge:
             raise RuntimeError
 
     def __eq__(self, other):
-        # TODO: a more sophisticated identity is needed: (edge_id,direction)
-        return self.path == self.other
+        if not isinstance(other, DirectionalGraphEdge):
+            return NotImplemented
+        return (self.edge_id, self._a_to_b) == (other.edge_id, other._a_to_b)
 
     def __hash__(self):
-        return hash(self.position)
+        return hash((self.edge_id, self._a_to_b))
@@ -1,4 +1,6 @@
 import collections
+import heapq
+import itertools
 
 
 class ShortestPathFinder:
@@ -30,8 +32,8 @@ class ShortestPathFinder:
 	
 	strategy:
 		state:
-		- maintain a list OpenPaths of all interesting paths which
-		  we may want to extend
+		- maintain a priority queue OpenPaths (ordered by min c(P)) of
+		  all interesting paths which we may want to extend
 		- maintain a dictionary UpperBound which holds for every
 		  node the upper bound to get there, i.e.
 		    max_{known path P) max c(P)
@@ -66,6 +68,9 @@ class ShortestPathFinder:
 		- get_edges(node) -> all edges from the given node
 		- exact_eval(path) -> exact length
 		- range_eval(path) -> tuple of min/max length
+		  (it is called exactly once per path when the path is created,
+		  the result is cached in path.c_min/path.c_max. in particular,
+		  the parent of a path is always evaluated before the path)
 	"""
 
     def __init__(self, nodes, get_edges, exact_eval, range_eval):
@@ -76,41 +81,55 @@ class ShortestPathFinder:
 
     def find_path(self, start, end):
 
-        # paths which have to be considered
+        # paths which have to be considered:
+        # heap of (min c(P), insertion counter, P), the counter
+        # makes sure that paths with the same min c(P) are extracted in
+        # the order in which they were added
         OpenPaths = []
+        counter = itertools.count()
         # map of node -> worst known distance to the node
         UpperBound = {}
         # optimal path
         P_opt = None
         P_opt_length = None
 
+        # keep statistics
+        c_evals = collections.defaultdict(int)
+        e_evals = collections.defaultdict(int)
+        N_rejected = collections.defaultdict(int)
+
+        def add_open_path(parent, edge):
+            """ create the path parent + edge and add it to OpenPaths """
+            P = Path(parent, edge)
+            # compute c(P) exactly once
+            P.c_min, P.c_max = self._range_eval(P)
+            c_evals[P.length] += 1
+            # lazy deletion: P would be skipped in 3. a) anyway
+            # (UpperBound never increases)
+            if P.end_node() in UpperBound and UpperBound[P.end_node()] < P.c_min:
+                N_rejected[P.length] += 1
+                return
+            heapq.heappush(OpenPaths, (P.c_min, next(counter), P))
+
         # initialise OpenPaths:
         # iterate over the edges of the start node
         for edge in self._get_edges(start):
             # add everything except loops
             if edge.end() != start:
-                OpenPaths.append(Path(None, edge))
+                add_open_path(None, edge)
 
         # initialise UpperBound:
         # we can get to start directly
         UpperBound[start] = 0.
 
-        # keep statistics
-        c_evals = collections.defaultdict(int)
-        e_evals = collections.defaultdict(int)
-        N_rejected = collections.defaultdict(int)
-
         while OpenPaths:
             # 1. extract the element with the smallest min c(P)
-            P = min(OpenPaths, key=lambda P: self._range_eval(P)[0])
-            OpenPaths.remove(P)
+            _, _, P = heapq.heappop(OpenPaths)
+            min_cP, max_cP = P.c_min, P.c_max
 
             # print("current", str(P))
 
             # 2. if P_opt exists, test the length
-            # compute c(P)
-            min_cP, max_cP = self._range_eval(P)
-            c_evals[P.length] += 1
             # print("c(P):", min_cP,max_cP)
 
             # if all following paths are longer
@@ -154,8 +173,7 @@ class ShortestPathFinder:
                         break
                 else:
                     # otherwise add the extended path to OpenPaths
-                    new_P = P.get_extended_by(edge)
-                    OpenPaths.append(new_P)
+                    add_open_path(P, edge)
 
         def f(dd):
             s = sum(dd.values())
@@ -174,12 +192,19 @@ class Path:
     """
 		represents a collection of edges
 	"""
+    __slots__ = ('_parent', '_edge', 'length', 'c_min', 'c_max', 'exact_data')
 
     def __init__(self, parent, edge):
         self._parent = parent  # can be None
         self._edge = edge
         self.length = parent.length + 1 if parent else 1
 
+        # cached range estimate c(P), init by ShortestPathFinder
+        self.c_min = None
+        self.c_max = None
+        # data which exact_eval may cache for the path (and its extensions)
+        self.exact_data = None
+
     def end_node(self):
         """ return the end node """
         return self._edge.end()
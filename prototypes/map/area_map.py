@@ -1,8 +1,24 @@
+import array
+import bisect
 import collections
+import itertools
+import math
+import re
 
 from geometry import vector, halfplane
 from map import map_base
 
+# runs of ones/zeros in a mask
+_run_of_ones = re.compile(b'\x01+')
+_run_of_zeros = re.compile(b'\x00+')
+# translation table which inverts a mask
+_invert_mask = bytes([1, 0]) + bytes(254)
+
+
+def _edge_order(edge):
+    """ the canonical order of the edges of an area: row-major by their midpoints """
+    return edge.a.y + edge.b.y, edge.a.x + edge.b.x
+
 
 class AreaMap(map_base.MapBase):
     """
@@ -14,23 +30,332 @@ class AreaMap(map_base.MapBase):
     """
     no_area_id = -1
 
-    def __init__(self, raw_map, pass_test):
+    def __init__(self, raw_map, pass_test, array_backed=False, flood_fill=False):
+        """
+            pass_test is either a function (pixel value -> is the tile passable?)
+            or a lookup table created by RawMap.compile_pass_test.
+            if array_backed is true, the area data is stored in a
+            2-D int32 NumPy array (see MapBase).
+            if flood_fill is true, the areas are found by the (slow) tile by tile
+            flood fill, which is kept as the reference implementation.
+        """
         self.raw_map = raw_map
         self.pass_test = pass_test
+        self.flood_fill = flood_fill
+
+        # compile the pass test into a lookup table (if needed) and
+        # convert the whole map into the passability mask
+        if callable(pass_test):
+            self.pass_table = self.raw_map.compile_pass_test(pass_test)
+        else:
+            self.pass_table = bytes(pass_test)
+        self.passable = self.raw_map.passability_mask(self.pass_table)
 
         # initialise area with self.no_area_id
-        area_data = [self.no_area_id for _ in self.raw_map.data]
+        # (do not iterate over the raw data, it may be a memory mapped buffer)
+        if array_backed:
+            if map_base.numpy is None:
+                raise RuntimeError("The array-backed mode needs NumPy.")
+            area_data = map_base.numpy.full((self.raw_map.height, self.raw_map.width),
+                                            self.no_area_id, dtype=map_base.numpy.int32)
+        else:
+            area_data = [self.no_area_id] * (self.raw_map.width * self.raw_map.height)
         super(AreaMap, self).__init__(self.raw_map.width, self.raw_map.height, area_data)
         # list of representatives of the areas, i.e. a random point of every area
         self.representatives = collections.defaultdict(set)
         # edges of areas, to the left is the inner area
         self.edges = collections.defaultdict(list)
+        # index of the unpassable tiles (see _get_obstacle_index), summed-area
+        # table of the unpassable tiles (see _get_blocked_table) and the area ids
+        # of the points (see get_point_area_ids), created on demand
+        self._obstacle_index = None
+        self._blocked_table = None
+        self._point_area_ids = None
+        # statistics: number of iterations of optimise_path_loose_ends -> number of calls
+        self.loose_ends_iterations = collections.Counter()
 
         # create area map
         self._create_area_map()
 
+    def __getstate__(self):
+        """
+            the raw map (possibly a memory mapped file), the pass test (a function)
+            and the indices (which are created on demand) are not pickled
+        """
+        state = dict(self.__dict__)
+        state['raw_map'] = None
+        state['pass_test'] = None
+        state['_obstacle_index'] = None
+        state['_blocked_table'] = None
+        state['_point_area_ids'] = None
+        return state
+
+    def __setitem__(self, i, v):
+        super(AreaMap, self).__setitem__(i, v)
+        self._data_changed()
+
+    def set_row(self, y, x_start, values):
+        super(AreaMap, self).set_row(y, x_start, values)
+        self._data_changed()
+
+    def fill_row(self, y, x_start, x_end, value):
+        super(AreaMap, self).fill_row(y, x_start, x_end, value)
+        self._data_changed()
+
+    def set_values(self, xs, ys, values):
+        super(AreaMap, self).set_values(xs, ys, values)
+        self._data_changed()
+
+    def assign_where(self, mask, value):
+        super(AreaMap, self).assign_where(mask, value)
+        self._data_changed()
+
+    def _data_changed(self):
+        """ drop everything which is derived from the data """
+        self._obstacle_index = None
+        self._blocked_table = None
+        self._point_area_ids = None
+
     def _create_area_map(self):
         """ create it """
+        if self.flood_fill:
+            self._create_area_map_flood_fill()
+        else:
+            self._create_area_map_labelling()
+
+    def _create_area_map_labelling(self):
+        """
+            create the area map by labelling the (8-connected) components of the
+            unpassable tiles. this is a two-pass union-find over the runs of
+            unpassable tiles in every row. the area ids, the wall id and the
+            representatives are the same as for the flood fill.
+        """
+        width, height = self.width, self.height
+
+        # runs[y] is the list of (x_start, x_end, run_id) of the unpassable tiles in row y
+        runs = []
+        # union-find forest over the run ids
+        parent = []
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            i, j = find(i), find(j)
+            if i < j:
+                parent[j] = i
+            elif j < i:
+                parent[i] = j
+
+        #
+        # first pass: find the runs and merge runs of adjacent rows
+        #
+        previous_runs = []
+        for y in range(height):
+            index = y * width
+
+            current_runs = []
+            for match in _run_of_zeros.finditer(self.passable, index, index + width):
+                run_id = len(parent)
+                parent.append(run_id)
+                x_start, x_end = match.start() - index, match.end() - index
+                current_runs.append((x_start, x_end, run_id))
+
+            # merge with the runs of the previous row, the tiles x_start..x_end-1 touch
+            # (including the diagonal) the tiles x_start-1..x_end of the previous row
+            i = 0
+            for x_start, x_end, run_id in current_runs:
+                # skip the runs which end before
+                while i < len(previous_runs) and previous_runs[i][1] < x_start:
+                    i += 1
+                # merge with all runs which start before the end
+                j = i
+                while j < len(previous_runs) and previous_runs[j][0] <= x_end:
+                    union(previous_runs[j][2], run_id)
+                    j += 1
+
+            runs.append(current_runs)
+            previous_runs = current_runs
+
+        #
+        # second pass: assign the area ids
+        #
+
+        # find the roots of all components which touch the map boundary, they form the wall
+        wall_id = self.no_area_id + 1
+        wall_roots = set()
+        for y, current_runs in enumerate(runs):
+            for x_start, x_end, run_id in current_runs:
+                if y == 0 or y == height - 1 or x_start == 0 or x_end == width:
+                    wall_roots.add(find(run_id))
+
+        # the first tile of every other component in the order of tiles_iterator
+        # (i.e. x first, then y) and the number of tiles of the component
+        first_tile = {}
+        tile_count = collections.Counter()
+        for y, current_runs in enumerate(runs):
+            for x_start, x_end, run_id in current_runs:
+                root = find(run_id)
+                tile_count[root] += x_end - x_start
+                if root not in wall_roots and (root not in first_tile or (x_start, y) < first_tile[root]):
+                    first_tile[root] = (x_start, y)
+
+        # the areas are numbered by the order of their first tile
+        area_ids = {root: wall_id for root in wall_roots}
+        for area_id, root in enumerate(sorted(first_tile, key=first_tile.get), wall_id + 1):
+            area_ids[root] = area_id
+            self.representatives[area_id].add(vector.GridTile(*first_tile[root]))
+
+        # the representatives of the wall are the first tiles of the components
+        # in the order in which the flood fill treats the map boundary
+        # (x,y) -> run_id for all unpassable tiles on the map boundary
+        boundary_runs = {}
+        for y in {0, height - 1}:
+            for x_start, x_end, run_id in runs[y]:
+                boundary_runs.update(((x, y), run_id) for x in range(x_start, x_end))
+        for y, current_runs in enumerate(runs):
+            if current_runs and current_runs[0][0] == 0:
+                boundary_runs[(0, y)] = current_runs[0][2]
+            if current_runs and current_runs[-1][1] == width:
+                boundary_runs[(width - 1, y)] = current_runs[-1][2]
+
+        boundary_order = [(x, y) for x in range(width) for y in (0, height - 1)] + \
+                         [(x, y) for y in range(height) for x in (0, width - 1)]
+        for x, y in boundary_order:
+            if (x, y) in boundary_runs:
+                root = find(boundary_runs[(x, y)])
+                if root in wall_roots:
+                    self.representatives[wall_id].add(vector.GridTile(x, y))
+                    wall_roots.discard(root)
+                    print("labelled area number %d: it has %d points" % (wall_id, tile_count[root]))
+
+        for root, area_id in area_ids.items():
+            if area_id != wall_id:
+                print("labelled area number %d: it has %d points" % (area_id, tile_count[root]))
+
+        # write the area data
+        for y, current_runs in enumerate(runs):
+            for x_start, x_end, run_id in current_runs:
+                self.fill_row(y, x_start, x_end, area_ids[find(run_id)])
+
+        # find the edges
+        self._find_edges()
+
+    def _blocked_mask_row(self, y):
+        """ the row y as bytes, 1 for unpassable tiles and 0 otherwise """
+        index = y * self.width
+        return self.passable[index:index + self.width].translate(_invert_mask)
+
+    def _find_edges(self):
+        """
+            find the edges between unpassable and passable tiles (and the map boundary)
+            from the labelled map, the unpassable tile is to the right of the edge.
+
+            the transitions are found on whole rows: runs of unpassable tiles give the
+            vertical edges, the bitwise difference of adjacent rows the horizontal ones.
+            the edges of every area are created in the canonical order (see _edge_order).
+        """
+        width, height = self.width, self.height
+        wall_id = self.no_area_id + 1
+        GridPoint, GridEdge = vector.GridPoint, vector.GridEdge
+
+        def points(x_start, x_end, y):
+            """ the grid points (x_start,y),...,(x_end,y) """
+            return [GridPoint(x, y) for x in range(x_start, x_end + 1)]
+
+        # all bits set (one per tile)
+        all_tiles = int.from_bytes(b'\x01' * width, 'big')
+
+        # the mask of the row y and y+1
+        row_mask = self._blocked_mask_row(0)
+        row_bits = int.from_bytes(row_mask, 'big')
+
+        #
+        # the map boundary: passable tiles at the top
+        #
+        for match in _run_of_zeros.finditer(row_mask):
+            x_start, x_end = match.span()
+            ps = points(x_start, x_end, 0)
+            # inner side is to the right
+            self.edges[wall_id].extend(GridEdge(ps[i], ps[i + 1]) for i in range(len(ps) - 1))
+
+        for y in range(height):
+            row_values = self.get_row(y)
+
+            #
+            # vertical edges: the ends of the runs of unpassable tiles
+            # (all tiles of a run belong to the same area) and the map
+            # boundary on the left and right
+            #
+            if row_mask[0] == 0:
+                # inner side is to the left
+                self.edges[wall_id].append(GridEdge(GridPoint(0, y + 1), GridPoint(0, y)))
+            for match in _run_of_ones.finditer(row_mask):
+                x_start, x_end = match.span()
+                edges = self.edges[int(row_values[x_start])]
+                if x_start > 0:
+                    # passable tile to the left
+                    edges.append(GridEdge(GridPoint(x_start, y), GridPoint(x_start, y + 1)))
+                if x_end < width:
+                    # passable tile to the right
+                    edges.append(GridEdge(GridPoint(x_end, y + 1), GridPoint(x_end, y)))
+            if row_mask[-1] == 0:
+                # inner side is to the left
+                self.edges[wall_id].append(GridEdge(GridPoint(width, y), GridPoint(width, y + 1)))
+
+            #
+            # horizontal edges: transitions between the rows y and y+1
+            #
+            if y + 1 == height:
+                break
+
+            next_row_mask = self._blocked_mask_row(y + 1)
+            next_row_bits = int.from_bytes(next_row_mask, 'big')
+            next_row_values = self.get_row(y + 1)
+
+            # unpassable tiles in row y above passable tiles in row y+1 (down) and
+            # unpassable tiles in row y+1 below passable tiles in row y (up),
+            # both are merged to keep the edges ordered by x
+            down = (row_bits & (next_row_bits ^ all_tiles)).to_bytes(width, 'big')
+            up = (next_row_bits & (row_bits ^ all_tiles)).to_bytes(width, 'big')
+            runs = [match.span() + (False,) for match in _run_of_ones.finditer(down)]
+            runs.extend(match.span() + (True,) for match in _run_of_ones.finditer(up))
+            runs.sort()
+            for x_start, x_end, is_up in runs:
+                ps = points(x_start, x_end, y + 1)
+                if is_up:
+                    edges = self.edges[int(next_row_values[x_start])]
+                    edges.extend(GridEdge(ps[i + 1], ps[i]) for i in range(len(ps) - 1))
+                else:
+                    edges = self.edges[int(row_values[x_start])]
+                    edges.extend(GridEdge(ps[i], ps[i + 1]) for i in range(len(ps) - 1))
+
+            row_mask, row_bits = next_row_mask, next_row_bits
+
+        #
+        # the map boundary: passable tiles at the bottom
+        #
+        for match in _run_of_zeros.finditer(row_mask):
+            x_start, x_end = match.span()
+            ps = points(x_start, x_end, height)
+            # inner side is to the right
+            self.edges[wall_id].extend(GridEdge(ps[i + 1], ps[i]) for i in range(len(ps) - 1))
+
+        self.__keep_areas_with_edges()
+
+    def __keep_areas_with_edges(self):
+        """ only keep areas which have edges, in the order of the area ids """
+        edges = self.edges
+        self.edges = collections.defaultdict(list)
+        for area_id in sorted(edges):
+            if edges[area_id]:
+                self.edges[area_id] = edges[area_id]
+
+    def _create_area_map_flood_fill(self):
+        """ create it (reference implementation) """
         # create shortcuts
         width, height = self.raw_map.width, self.raw_map.height
 
@@ -46,7 +371,7 @@ class AreaMap(map_base.MapBase):
             t = vector.GridTile(x, 0)
             self.__process_tile(area_id, t)
 
-            if self.pass_test(self.raw_map[t]):
+            if self._is_passable(t):
                 p = vector.GridPoint(x, 0)
                 p_xpp = vector.GridPoint(x + 1, 0)
                 # inner side is to the right
@@ -56,7 +381,7 @@ class AreaMap(map_base.MapBase):
             t = vector.GridTile(x, height - 1)
             self.__process_tile(area_id, t)
 
-            if self.pass_test(self.raw_map[t]):
+            if self._is_passable(t):
                 p = vector.GridPoint(x, height)
                 p_xpp = vector.GridPoint(x + 1, height)
                 # inner side is to the right
@@ -67,7 +392,7 @@ class AreaMap(map_base.MapBase):
             t = vector.GridTile(0, y)
             self.__process_tile(area_id, t)
 
-            if self.pass_test(self.raw_map[t]):
+            if self._is_passable(t):
                 p = vector.GridPoint(0, y, )
                 p_ypp = vector.GridPoint(0, y + 1)
                 # inner side is to the left
@@ -77,7 +402,7 @@ class AreaMap(map_base.MapBase):
             t = vector.GridTile(width - 1, y)
             self.__process_tile(area_id, t)
 
-            if self.pass_test(self.raw_map[t]):
+            if self._is_passable(t):
                 p = vector.GridPoint(width, y, )
                 p_ypp = vector.GridPoint(width, y + 1)
                 # inner side is to the left
@@ -92,10 +417,18 @@ class AreaMap(map_base.MapBase):
                 # if we found something, increment area_id
                 area_id += 1
 
+        # bring the edges into the canonical order
+        for edges in self.edges.values():
+            edges.sort(key=_edge_order)
+
+    def _is_passable(self, t):
+        """ is the tile passable? """
+        return self.passable[t.x + t.y * self.width] == 1
+
     def __process_tile(self, area_id, t):
         # if the tile is unpassable and we did not know that before, process it,
         # otherwise skip it
-        if self.pass_test(self.raw_map[t]) or self[t] != self.no_area_id:
+        if self._is_passable(t) or self[t] != self.no_area_id:
             return False
 
         # add the current point as the representative of the area
@@ -124,7 +457,7 @@ class AreaMap(map_base.MapBase):
 
                 # if the point is passable, skip it, but before that check
                 # if this defines an edge
-                if self.pass_test(self.raw_map[tpp]):
+                if self._is_passable(tpp):
                     # it defines an edge if this is not a diagonal move,
                     # i.e. the distance is one
                     if (tpp - t).length_squared() == 1:
@@ -164,6 +497,114 @@ class AreaMap(map_base.MapBase):
             # nothing was found
             return self.no_area_id
 
+    def create_indices(self):
+        """
+            create the indices of the obstruction queries now (otherwise they
+            are created on demand), e.g. before the map is shared with workers
+        """
+        self._get_obstacle_index()
+        self._get_blocked_table()
+
+    def get_point_area_ids(self):
+        """
+            get the area ids of all points (see get_point_area_id): the area id of
+            the point (x,y) with 0 <= x <= width and 0 <= y <= height is
+            ids[x + y * (width + 1)], all other points belong to the wall.
+            the list is created on demand and dropped when the data changes.
+        """
+        if self._point_area_ids is None:
+            no_area_id, wall_id = self.no_area_id, self.no_area_id + 1
+            ids = []
+            # the tiles (x,y) and (x,y-1) of the current row of points
+            # (rows outside of the grid are None)
+            previous_row = None
+            for y in range(self.height + 1):
+                row = list(map(int, self.get_row(y))) if y < self.height else None
+                for x in range(self.width + 1):
+                    # check the adjacent tiles in the order of GridPoint.adjacent_tiles:
+                    # (x,y), (x,y-1), (x-1,y-1), (x-1,y), the first tile outside
+                    # of the grid belongs to the wall
+                    if row is None or x == self.width:
+                        ids.append(wall_id)
+                    elif row[x] != no_area_id:
+                        ids.append(row[x])
+                    elif previous_row is None:
+                        ids.append(wall_id)
+                    elif previous_row[x] != no_area_id:
+                        ids.append(previous_row[x])
+                    elif x == 0:
+                        ids.append(wall_id)
+                    elif previous_row[x - 1] != no_area_id:
+                        ids.append(previous_row[x - 1])
+                    elif row[x - 1] != no_area_id:
+                        ids.append(row[x - 1])
+                    else:
+                        ids.append(no_area_id)
+                previous_row = row
+            self._point_area_ids = ids
+        return self._point_area_ids
+
+    def _get_obstacle_index(self):
+        """
+            get the index of the unpassable tiles: for every row y, the tuple
+            (starts, ends) of the sorted lists of the runs of unpassable tiles,
+            i.e. the tiles (starts[k],y),...,(ends[k]-1,y) are unpassable.
+            the index is created on demand and dropped when the data changes.
+        """
+        if self._obstacle_index is None:
+            index = []
+            for y in range(self.height):
+                row = self.get_row(y)
+                if self.is_array_backed():
+                    mask = (row != self.no_area_id).tobytes()
+                else:
+                    mask = bytes([value != self.no_area_id for value in row])
+                runs = [match.span() for match in _run_of_ones.finditer(mask)]
+                index.append(([x_start for x_start, _ in runs], [x_end for _, x_end in runs]))
+            self._obstacle_index = index
+        return self._obstacle_index
+
+    def _get_blocked_table(self):
+        """
+            get the summed-area table of the unpassable tiles: table[x + y * (width + 1)]
+            is the number of unpassable tiles (x',y') with x' < x and y' < y.
+            the table is a flat NumPy array in the array-backed mode and an array('q')
+            otherwise, it is created on demand and dropped when the data changes.
+        """
+        if self._blocked_table is None:
+            if self.is_array_backed():
+                numpy = map_base.numpy
+                table = numpy.zeros((self.height + 1, self.width + 1), dtype=numpy.int64)
+                blocked = self.array != self.no_area_id
+                table[1:, 1:] = blocked.cumsum(axis=0).cumsum(axis=1)
+                table = table.ravel()
+            else:
+                row_table = [0] * (self.width + 1)
+                table = array.array('q', row_table)
+                for y in range(self.height):
+                    blocked = (value != self.no_area_id for value in self.get_row(y))
+                    row_counts = itertools.accumulate(blocked, initial=0)
+                    row_table = [a + b for a, b in zip(row_table, row_counts)]
+                    table.extend(row_table)
+            self._blocked_table = table
+        return self._blocked_table
+
+    def count_blocked_tiles(self, x_start, y_start, x_end, y_end):
+        """
+            count the unpassable tiles (x,y) with x_start <= x < x_end and
+            y_start <= y < y_end, the box is clipped to the map. this takes
+            constant time (summed-area table).
+        """
+        x_start, x_end = max(x_start, 0), min(x_end, self.width)
+        y_start, y_end = max(y_start, 0), min(y_end, self.height)
+        if x_start >= x_end or y_start >= y_end:
+            return 0
+
+        table = self._get_blocked_table()
+        row_start, row_end = y_start * (self.width + 1), y_end * (self.width + 1)
+        return int(table[row_end + x_end] - table[row_start + x_end]
+                   - table[row_end + x_start] + table[row_start + x_start])
+
     def find_obstruction_when_transforming_line(self, base, start, end):
         """
             is there any obstruction to transforming base->start to base->end?
@@ -172,6 +613,97 @@ class AreaMap(map_base.MapBase):
                 base->start->start+t*(end-start)
             intersects no unpassable tiles. Assuming that no obstruction
             lies on the lines base->start and start->end.
+
+            the result is the same as the one of find_obstruction_when_transforming_line_slow
+            (under the above assumption), but only the unpassable runs of the rows of the
+            triangle are visited (using the obstacle index). the extreme point of a run is
+            always one of its four corners, so only these are examined (in the same order
+            as the tile by tile scan).
+        """
+        assert (isinstance(base, vector.PointF))
+        assert (isinstance(start, vector.PointF))
+        assert (isinstance(end, vector.PointF))
+
+        # early exit: the bounding box of the triangle (which contains all tiles
+        # of the triangle, with a margin for the rounding) contains no unpassable tile
+        eps = 1e-6
+        xs, ys = (base.x, start.x, end.x), (base.y, start.y, end.y)
+        if self.count_blocked_tiles(math.floor(min(xs) - eps), math.floor(min(ys) - eps),
+                                    math.ceil(max(xs) + eps), math.ceil(max(ys) + eps)) == 0:
+            return 1., None
+
+        # find the interior of the triangle
+        v_start = start - base
+        v_end = end - base
+        v_start_left = v_start.left()
+
+        # if leftness > 0, the interior is to the left of v_start,
+        # otherwise to the right
+        leftness = v_start_left * v_end
+        leftness_sign = +1 if leftness >= 0 else -1
+
+        obstacle_index = self._get_obstacle_index()
+        base_x, base_y = base.x, base.y
+
+        # the obstructing point (as coordinates) and the vector base->obstructing_point
+        obstructing_point = None
+        v_x, v_y = None, None
+
+        for y, x_min, x_max in self.find_tile_spans_in_triangle_iterator(base, start, end):
+            starts, ends = obstacle_index[y]
+
+            # iterate over all runs of unpassable tiles which intersect x_min..x_max-1
+            # (the row is skipped after one binary search if there is none)
+            k = bisect.bisect_right(ends, x_min)
+            while k < len(starts) and starts[k] < x_max:
+                x_a, x_b = max(starts[k], x_min), min(ends[k], x_max)
+                k += 1
+
+                # the corners of the run (in the order in which the tiles see them)
+                for point in ((x_a, y), (x_a, y + 1), (x_b, y + 1), (x_b, y)):
+                    # compute v_point
+                    w_x, w_y = float(point[0]) - base_x, float(point[1]) - base_y
+
+                    if obstructing_point is None:
+                        # if we do not yet have an obstructing point, this one is one
+                        obstructing_point, v_x, v_y = point, w_x, w_y
+                        continue
+
+                    # see find_obstruction_when_transforming_line_slow:
+                    # the scalar product of v_obstructing_point.right() and v_point
+                    scalar_product = v_y * w_x + (-v_x) * w_y
+
+                    if leftness_sign * scalar_product > 0 \
+                            or \
+                            (scalar_product == 0 and w_x * w_x + w_y * w_y > v_x * v_x + v_y * v_y):
+                        # we have a new candidate
+                        obstructing_point, v_x, v_y = point, w_x, w_y
+
+        # if there is no obstruction point
+        if obstructing_point is None:
+            return 1., None
+        else:
+            # otherwise, compute t value
+
+            # t value now is the intersection of the start->end line with the
+            # halfplane which is defined by base->obstruction point
+            obstructing_point = vector.GridPoint(*obstructing_point)
+            v_obstruction_normal = (obstructing_point.toPointF() - base).left()
+            hp = halfplane.HalfPlane(base, v_obstruction_normal)
+            t = hp.find_t(start, end)
+
+            return t, obstructing_point
+
+    def find_obstruction_when_transforming_line_slow(self, base, start, end):
+        """
+            is there any obstruction to transforming base->start to base->end?
+
+            or, to put it differently, find the biggest t such that the triangle
+                base->start->start+t*(end-start)
+            intersects no unpassable tiles. Assuming that no obstruction
+            lies on the lines base->start and start->end.
+
+            this is the reference implementation which examines all tiles in the triangle.
         """
         assert (isinstance(base, vector.PointF))
         assert (isinstance(start, vector.PointF))
@@ -255,7 +787,8 @@ class AreaMap(map_base.MapBase):
         path_changed = False
 
         # start new path with the starting point of the old path, truncate old_path
-        path, old_path = vector.PathF(path.points[0:1]), vector.PathF(path.points[1:])
+        # (old_path is consumed from the start, hence use a deque)
+        path, old_path = vector.PathF(path.points[0:1]), vector.DequePathF(path.points[1:])
 
         while not old_path.empty():
             # take the last point of the new path
@@ -306,13 +839,103 @@ class AreaMap(map_base.MapBase):
 
         return path, path_changed
 
+    def __pull_path(self, path, max_steps):
+        """
+            optimise the path in a single pass (string pulling): the points of the path
+            are added one by one to the new path. before a point is added, the last point
+            of the new path is checked: if it is not necessary, it is removed and the check
+            is repeated with the previous point. if the obstruction lies between, it is
+            added as in the iterative version.
+
+            every point of the result was checked against its final neighbours (except
+            for inserted obstructions which lie on the line between their neighbours).
+            returns None if the path was not finished after max_steps steps.
+        """
+        # the new path and the points which still have to be added (the next one is last)
+        new_points = path.points[0:1]
+        open_points = path.points[:0:-1]
+        # the last inserted obstruction as (base, obs, pt), these points lie on a line
+        line = None
+
+        for step in range(max_steps):
+            if not open_points:
+                break
+            p1 = open_points[-1]
+
+            # the start point may not be removed
+            if len(new_points) < 2:
+                new_points.append(open_points.pop())
+                continue
+
+            base, p0 = new_points[-2], new_points[-1]
+
+            # if p0 is the inserted obstruction between base and p1, it is necessary
+            # (the triangle base->p0->p1 is degenerate, so the check would remove it)
+            if line is not None and line[0] is base and line[1] is p0 and line[2] is p1:
+                new_points.append(open_points.pop())
+                line = None
+                continue
+
+            # the goal is to optimise the path base->p0->p1,
+            # see __optimise_path_iteration
+            t, obs = self.find_obstruction_when_transforming_line(base, p0, p1)
+            obs = obs.toPointF() if obs is not None else None
+
+            if obs is None:
+                # case: we can replace the path by base->p1, remove p0
+                # and check base in the next step
+                new_points.pop()
+            elif obs == p0:
+                # case: p0 is part of the obstruction, hence necessary
+                new_points.append(open_points.pop())
+            else:
+                # case: we found an obstruction, replace base->p0->p1 by
+                # base->obs->pt->p1 with pt = p0+t*(p1-p0). base has a new
+                # neighbour, so it is checked again when obs is added
+                new_points.pop()
+                pt = p0 + (p1 - p0).scaled(t)
+                pt = vector.PointF(pt.x, pt.y)
+                if obs != pt:
+                    open_points.append(pt)
+                    line = (base, obs, pt)
+                open_points.append(obs)
+        else:
+            return None
+
+        path = vector.PathF(new_points)
+        print("new path: length: %s, nodes: %d" % (path.length(), path.node_count()))
+        return path
+
     def optimise_path(self, path, max_iterations=20):
         """
             find the shortest path (in the homotopy class) between
             path.start() and path.end() taking path as the starting point
+
+            the path is optimised in a single pass (see __pull_path), if this fails,
+            the iterative version is used (with max_iterations iterations).
         """
         print("optimising path of length %s (nodes: %d)..." % (path.length(), path.node_count()))
 
+        opt_path = self.__pull_path(path, 100 * path.node_count() + 1000)
+        if opt_path is not None:
+            print("done")
+            return opt_path
+
+        print("single pass optimisation failed, using the iterative optimisation")
+        return self.__optimise_path_iterative(path, max_iterations)
+
+    def optimise_path_iterative(self, path, max_iterations=20):
+        """
+            find the shortest path (in the homotopy class) between
+            path.start() and path.end() taking path as the starting point
+
+            the path is optimised iteratively until it does not change anymore.
+        """
+        print("optimising path of length %s (nodes: %d)..." % (path.length(), path.node_count()))
+        return self.__optimise_path_iterative(path, max_iterations)
+
+    def __optimise_path_iterative(self, path, max_iterations):
+        """ the iterations of optimise_path_iterative """
         for iteration in range(max_iterations):
             # optimise the path
             path, path_changed = self.__optimise_path_iteration(path)
@@ -328,6 +951,40 @@ class AreaMap(map_base.MapBase):
 
         return path
 
+    def extend_optimised_path(self, opt_path, extension, window=2):
+        """
+            find the optimised version of opt_path + extension where opt_path
+            is already optimised (e.g. by optimise_path) and extension starts
+            at the end of opt_path.
+
+            only the last window nodes of opt_path and the extension are
+            optimised. the window is doubled until the first node of the
+            window stays necessary, i.e. until the prefix is not affected.
+        """
+        points = opt_path.points
+        extension = list(extension.points)
+        if points and extension and points[-1] == extension[0]:
+            extension = extension[1:]
+
+        while True:
+            # the nodes points[:start] are kept, points[start] is fixed
+            start = max(0, len(points) - 1 - window)
+            tail = self.optimise_path(vector.PathF(points[start:] + extension))
+
+            if start == 0:
+                return tail
+
+            # points[start] is still necessary iff it is the obstruction
+            # when transforming points[start-1]->points[start] to points[start-1]->tail[1]
+            if tail.node_count() >= 2:
+                base, node = points[start - 1], points[start]
+                t, obs = self.find_obstruction_when_transforming_line(base, node, tail.points[1])
+                if obs is not None and obs.toPointF() == node:
+                    return vector.PathF(points[:start] + tail.points)
+
+            # otherwise, the prefix is affected: enlarge the window
+            window *= 2
+
     @staticmethod
     def __project_point_on_line(p, a, b):
         """ project the point p on the line a->b """
@@ -385,6 +1042,33 @@ class AreaMap(map_base.MapBase):
                     path.points.append(pt)
         return path
 
+    @staticmethod
+    def __closest_points_on_lines(a0, a1, b0, b1):
+        """
+            find the closest points p on the line a0->a1 and q on the line b0->b1,
+            if the lines cross, p and q are the crossing point, otherwise one of
+            the points is an end point
+        """
+        # solve a0 + s(a1 - a0) = b0 + t(b1 - b0) for s and t
+        da, db, d0 = a1 - a0, b1 - b0, b0 - a0
+        denominator = da.x * db.y - da.y * db.x
+        if denominator != 0:
+            s = (d0.x * db.y - d0.y * db.x) / denominator
+            t = (d0.x * da.y - d0.y * da.x) / denominator
+            if 0. <= s <= 1. and 0. <= t <= 1.:
+                p = a0 + s * da
+                p = vector.PointF(p.x, p.y)
+                return p, p
+
+        project = AreaMap.__project_point_on_line
+        candidates = [
+            (a0, project(a0, b0, b1)),
+            (a1, project(a1, b0, b1)),
+            (project(b0, a0, a1), b0),
+            (project(b1, a0, a1), b1),
+        ]
+        return min(candidates, key=lambda p_q: (p_q[1] - p_q[0]).length_squared())
+
     def optimise_path_loose_ends(self, path, start_a, start_b, end_a, end_b, max_iterations=1000):
         """
             find the shortest path (in the homotopy class) between
@@ -394,6 +1078,13 @@ class AreaMap(map_base.MapBase):
             it is assumed that the lines do not intersect except possibly
             at an end point
 
+            every iteration optimises the path (see optimise_path) and then
+            moves the end points to the projections of their neighbours on the
+            lines (correcting for obstructions, see optimise_point_to_line).
+            if the optimised path is a straight line, the closest points of
+            the two lines are used directly. the number of iterations is
+            recorded in loose_ends_iterations.
+
             the high max iteration count is due to convergence issues
             in the projection step.
         """
@@ -418,9 +1109,21 @@ class AreaMap(map_base.MapBase):
         if path.points[-1] != e:
             path.points.append(e)
 
-        for iteration in range(max_iterations):
+        for iteration in range(1, max_iterations + 1):
             # optimise the path
-            path, path_changed = self.__optimise_path_iteration(path)
+            path = self.optimise_path(path)
+
+            if path.node_count() == 2:
+                # the end points see each other: if they can be moved to the closest
+                # points of the lines, this is the solution
+                s, e = self.__closest_points_on_lines(start_a, start_b, end_a, end_b)
+                p0, p1 = path.points
+                if s == p0 or self.find_obstruction_when_transforming_line(p1, p0, s)[1] is None:
+                    if e == p1 or self.find_obstruction_when_transforming_line(s, p1, e)[1] is None:
+                        path = vector.PathF([s, e])
+                        break
+
+            path_changed = False
 
             # compute the path from path.points[1] to the line start_a->start_b
             partial_path = self.optimise_point_to_line(path.points[1], path.points[0], start_a, start_b)
@@ -429,19 +1132,20 @@ class AreaMap(map_base.MapBase):
                 path.points[:2] = reversed(partial_path.points)
                 path_changed = True
 
-            # compute the path from path.points[-2] to the line start_a->start_b
+            # compute the path from path.points[-2] to the line end_a->end_b
             partial_path = self.optimise_point_to_line(path.points[-2], path.points[-1], end_a, end_b)
             # add it needed (which is identified by a change of base points)
             if partial_path.points[-1] != path.points[-1]:
                 path.points[-2:] = partial_path.points
                 path_changed = True
 
-            # do it until the path does not change anymore
+            # do it until the end points do not change anymore
             if not path_changed:
                 break
         else:
             raise RuntimeError("Needed way too many iterations.")
 
-        print("done")
+        self.loose_ends_iterations[iteration] += 1
+        print("done after %d iterations" % iteration)
 
         return path
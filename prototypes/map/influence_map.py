@@ -9,208 +9,287 @@ class InfluenceMap(map_base.MapBase):
 		balloon the boundary area while preserving the homotopy type of the loops
 	"""
 
-    def __init__(self, area_map):
+    def __init__(self, area_map, full_sweeps=False):
+        """
+			if full_sweeps is true, every loop is swept completely in every
+			expansion step (the reference implementation), otherwise only
+			the edges which may still expand are visited (see _create_influence_map).
+		"""
         # save the area map
         self.area_map = area_map
+        self.full_sweeps = full_sweeps
 
         # initialise influence data with the area map data
+        # (in the same storage mode as the area map)
         super(InfluenceMap, self).__init__(self.area_map.width,
                                            self.area_map.height,
-                                           self.area_map.data[:])
+                                           self.area_map.copy_data())
         # dictionary: area_id -> loops of influence boundaries
         self.boundaries = {}
 
         # create area map
-        self._create_influence_map()
+        if self.full_sweeps:
+            self._create_influence_map_slow()
+        else:
+            self._create_influence_map()
 
     def _create_influence_map(self):
+        """
+			balloon the boundaries. the result is the same as the one of
+			_create_influence_map_slow, but only edges which were created in
+			the previous step are visited: all other edges face a tile which is
+			outside the grid or already assigned, hence they never expand again.
+			the total work is proportional to the number of assigned tiles.
+		"""
         # go through the edges and find all loops
         for area_id, edges in self.area_map.edges.items():
             self.boundaries[area_id] = self.decompose_edges_into_loops(edges)
 
         print("ballooning boundaries... ")
 
+        # the loops which may still expand (in the order of the full sweeps)
+        active_loops = [(area_id, CyclicUpdateLoop(loop), loops, loop_id)
+                        for area_id, loops in self.boundaries.items()
+                        for loop_id, loop in enumerate(loops)]
+
         step = 0
         # ballooning boundaries
-        while True:
+        while active_loops:
             step += 1
-            print("expansion step number %d..." % step)
+            print("expansion step number %d (active loops: %d)..." % (step, len(active_loops)))
 
             # was a boundary expanded? if not, we are done
             expanded = False
 
-            # keep track of finished loops
-            finished_loops = []
+            for area_id, update_loop, loops, loop_id in active_loops:
+                # the first edge of the loop (before the update)
+                first_edge = update_loop.first()
 
-            for area_id, loops in self.boundaries.items():
-                for loop_id in range(len(loops)):
-                    # skip if the loop is finished
-                    if (area_id, loop_id) in finished_loops:
-                        continue
+                # visit the edges (in the order of the loop)
+                loop_expanded = False
+                for node in update_loop.begin_update():
+                    if update_loop.seek(node):
+                        loop_expanded |= self.__expand_edge(area_id, update_loop)
+
+                # if the loop is empty, add the smallest possible loop (see __expand_loop)
+                if update_loop.length() == 0:
+                    update_loop = CyclicUpdateLoop([first_edge, vector.GridEdge(first_edge.b, first_edge.a)])
+                    loop_expanded = False
+
+                # keep track of the expanded state
+                expanded |= loop_expanded
+
+                loops[loop_id] = update_loop
+
+            # we are done if nothing was expanded
+            if not expanded:
+                break
+
+            # only loops with new edges can expand in the next step
+            active_loops = [(area_id, loops[loop_id], loops, loop_id)
+                            for area_id, _, loops, loop_id in active_loops
+                            if loops[loop_id].has_pending()]
+
+        # convert the loops back into lists
+        for loops in self.boundaries.values():
+            for loop_id, loop in enumerate(loops):
+                if isinstance(loop, CyclicUpdateLoop):
+                    loops[loop_id] = loop.get_array()
+
+    def _create_influence_map_slow(self):
+        """
+			balloon the boundaries by sweeping over all loops
+			until nothing changes anymore
+		"""
+        # go through the edges and find all loops
+        for area_id, edges in self.area_map.edges.items():
+            self.boundaries[area_id] = self.decompose_edges_into_loops(edges)
+
+        print("ballooning boundaries... ")
+
+        # the loops are updated in place
+        for loops in self.boundaries.values():
+            loops[:] = [CyclicUpdateLoop(loop) for loop in loops]
 
-                    # the old loop which we want to expand
-                    loop = loops[loop_id]
+        step = 0
+        # ballooning boundaries
+        while True:
+            step += 1
+            print("expansion step number %d..." % step)
 
-                    # the new, expanded loop
-                    loop_expanded, new_loop = self.__expand_loop(area_id, loop)
+            # was a boundary expanded? if not, we are done
+            expanded = False
 
-                    # replace the old loop
-                    loops[loop_id] = new_loop
+            for area_id, loops in self.boundaries.items():
+                for loop_id in range(len(loops)):
+                    # expand the loop (it is replaced if it became empty)
+                    loop_expanded, loops[loop_id] = self.__expand_loop(area_id, loops[loop_id])
 
                     # keep track of the expanded state
                     expanded |= loop_expanded
 
-                    # keep track of finished loops
-                    if loop_expanded:
-                        finished_loops.append((area_id, loop_id))
-
             # we are done if nothing was expanded
             if not expanded:
                 break
 
-    def __expand_loop(self, area_id, loop):
+        # convert the loops back into lists
+        for loops in self.boundaries.values():
+            loops[:] = [loop.get_array() for loop in loops]
+
+    def __expand_loop(self, area_id, update_loop):
         """
-			expand the given loop and mark all new areas with
-			the given area_id
+			expand the given loop (a CyclicUpdateLoop, it is updated in place)
+			and mark all new areas with the given area_id
 		"""
-        # compute an pseudo in-place update array
-        update_loop = PseudoInPlaceUpdateArray(loop)
+        # the first edge of the loop (before the update)
+        first_edge = update_loop.first()
+        update_loop.begin_update()
 
         # keep track if the loop was expanded
         loop_expanded = False
 
         # go through edges of loop and see if we can expand it
-        # (use index based iterator as the list is going to change)
         while not update_loop.is_finished():
-            # get current edge and compute outer tile, i.e. the tile to the left
-            edge = update_loop.get(0)
-            tile_outer = edge.left_tile()
-
-            # keep the original if the tile does not define a valid tile,
-            # i.e. the tile does not belong to the grid
-            if not self.contains(tile_outer):
+            if self.__expand_edge(area_id, update_loop):
+                # set expanded to true as we expanded the current edge
+                loop_expanded = True
+            else:
+                # keep the original
                 update_loop.confirm()
-                continue
 
-            # keep the original if the outer tile was already assigned to an area
-            if self[tile_outer] != self.area_map.no_area_id:
-                update_loop.confirm()
-                continue
+        # if the loop is empty, add the smallest possible loop
+        # (this is only a hack, still the situation probably only arises
+        #  under synthetic conditions)
+        if update_loop.length() == 0:
+            # create the smallest loop a->b and b->a
+            inverse_edge = vector.GridEdge(first_edge.b, first_edge.a)
+            return False, CyclicUpdateLoop([first_edge, inverse_edge])
 
-            # set expanded to true as we are going to expand the current edge
-            loop_expanded = True
-
-            # mark the new area
-            self[tile_outer] = area_id
-
-            # get left facing vector
-            v_left = edge.direction().left()
-
-            # create new points by translating the old ones to the left
-            new_a, new_b = edge.a + v_left, edge.b + v_left
-            new_a = vector.GridPoint(new_a.x, new_a.y)
-            new_b = vector.GridPoint(new_b.x, new_b.y)
-
-            # the configuration looks like that:
-            # new_a----new_b
-            #     |    |
-            #     |    |
-            # ----a----b-----
-            # i-1   i    i+1
-
-            #
-            # compute the plan
-            #
-
-            # if the (i-1)-th edge is the inverse of a->new_a,
-            # then the (i-1)-th gets annihilated
-            edge_imm = update_loop.get(-1)
-            # it always holds that edge_imm.b == edge.a
-            assert (edge_imm.b == edge.a)
-            imm_annihilated = (edge_imm.a == new_a)
-
-            # if the (i-1)-th edge get annihilated and
-            # (i-2)-th edge is the inverse of the edge new_a->new_b,
-            # then the (i-2)-th gets annihilated
-            edge_immmm = update_loop.get(-2)
-            if imm_annihilated:
-                assert (edge_immmm.b == new_a)
-            immmm_annihilated = imm_annihilated and (edge_immmm.a == new_b)
-
-            # if the (i+1)-th edge is the inverse of new_b->b,
-            # then the (i+1)-th gets annihilated
-            edge_ipp = update_loop.get(+1)
-            # it always holds that edge.b == edge[ipp].a
-            assert (edge.b == edge_ipp.a)
-            ipp_annihilated = (new_b == edge_ipp.b)
-
-            # if the (i+1)-th edge get annihilated and
-            # (i+2)-th edge is the inverse of the edge new_a->new_b,
-            # then the (i+2)-th gets annihilated
-            edge_ipppp = update_loop.get(+2)
-            if ipp_annihilated:
-                assert (edge_ipppp.a == new_b)
-            ipppp_annihilated = ipp_annihilated and (edge_ipppp.b == new_a)
-
-            #
-            # add and remove edges accordingly
-            #
-            if imm_annihilated:
-                # delete the edge
-                update_loop.delete(-1)
-                # if we also have to delete the other edge
-                if immmm_annihilated:
-                    update_loop.delete(-1)
-            else:
-                # we have to add the edge a->new_a
-                new_edge = vector.GridEdge(edge.a, new_a)
-                update_loop.insert(new_edge)
+        return loop_expanded, update_loop
 
-            # delete the current edge
-            update_loop.delete(0)
+    def __expand_edge(self, area_id, update_loop):
+        """
+			expand the current edge of update_loop (and mark the new area
+			with the given area_id), returns False if the edge cannot be
+			expanded (the loop is unchanged in this case)
+		"""
+        # get current edge and compute outer tile, i.e. the tile to the left
+        edge = update_loop.get(0)
+        tile_outer = edge.left_tile()
+
+        # keep the original if the tile does not define a valid tile,
+        # i.e. the tile does not belong to the grid
+        if not self.contains(tile_outer):
+            return False
+
+        # keep the original if the outer tile was already assigned to an area
+        if self[tile_outer] != self.area_map.no_area_id:
+            return False
+
+        # mark the new area
+        self[tile_outer] = area_id
+
+        # get left facing vector
+        v_left = edge.direction().left()
+
+        # create new points by translating the old ones to the left
+        new_a, new_b = edge.a + v_left, edge.b + v_left
+        new_a = vector.GridPoint(new_a.x, new_a.y)
+        new_b = vector.GridPoint(new_b.x, new_b.y)
+
+        # the configuration looks like that:
+        # new_a----new_b
+        #     |    |
+        #     |    |
+        # ----a----b-----
+        # i-1   i    i+1
+
+        #
+        # compute the plan
+        #
+
+        # if the (i-1)-th edge is the inverse of a->new_a,
+        # then the (i-1)-th gets annihilated
+        edge_imm = update_loop.get(-1)
+        # it always holds that edge_imm.b == edge.a
+        assert (edge_imm.b == edge.a)
+        imm_annihilated = (edge_imm.a == new_a)
+
+        # if the (i-1)-th edge get annihilated and
+        # (i-2)-th edge is the inverse of the edge new_a->new_b,
+        # then the (i-2)-th gets annihilated
+        edge_immmm = update_loop.get(-2)
+        if imm_annihilated:
+            assert (edge_immmm.b == new_a)
+        immmm_annihilated = imm_annihilated and (edge_immmm.a == new_b)
+
+        # if the (i+1)-th edge is the inverse of new_b->b,
+        # then the (i+1)-th gets annihilated
+        edge_ipp = update_loop.get(+1)
+        # it always holds that edge.b == edge[ipp].a
+        assert (edge.b == edge_ipp.a)
+        ipp_annihilated = (new_b == edge_ipp.b)
+
+        # if the (i+1)-th edge get annihilated and
+        # (i+2)-th edge is the inverse of the edge new_a->new_b,
+        # then the (i+2)-th gets annihilated
+        edge_ipppp = update_loop.get(+2)
+        if ipp_annihilated:
+            assert (edge_ipppp.a == new_b)
+        ipppp_annihilated = ipp_annihilated and (edge_ipppp.b == new_a)
+
+        #
+        # add and remove edges accordingly
+        #
+        if imm_annihilated:
+            # delete the edge
+            update_loop.delete(-1)
+            # if we also have to delete the other edge
+            if immmm_annihilated:
+                update_loop.delete(-1)
+        else:
+            # we have to add the edge a->new_a
+            new_edge = vector.GridEdge(edge.a, new_a)
+            update_loop.insert(new_edge)
 
-            if immmm_annihilated or ipppp_annihilated:
-                # we do not have to add the edge new_a->new_b
-                pass
-            else:
-                # we have to add it
-                new_edge = vector.GridEdge(new_a, new_b)
-                update_loop.insert(new_edge)
+        # delete the current edge
+        update_loop.delete(0)
 
-            if ipp_annihilated:
-                # delete the edge (-1 as we just deleted the current edge)
+        if immmm_annihilated or ipppp_annihilated:
+            # we do not have to add the edge new_a->new_b
+            pass
+        else:
+            # we have to add it
+            new_edge = vector.GridEdge(new_a, new_b)
+            update_loop.insert(new_edge)
+
+        if ipp_annihilated:
+            # delete the edge (-1 as we just deleted the current edge)
+            update_loop.delete(+1 - 1)
+            # if we also have to delete the other edge
+            if ipppp_annihilated and not immmm_annihilated:
                 update_loop.delete(+1 - 1)
-                # if we also have to delete the other edge
-                if ipppp_annihilated and not immmm_annihilated:
-                    update_loop.delete(+1 - 1)
-            else:
-                # we have to add the new_b->edge b
-                new_edge = vector.GridEdge(new_b, edge.b)
-                update_loop.insert(new_edge)
-
-        new_loop = update_loop.get_array()
-        # if the loop is empty, add the smallest possible loop
-        # (this is only a hack, still the situation probably only arises
-        #  under synthetic conditions)
-        if not new_loop:
-            # create the smallest loop a->b and b->a
-            edge = loop[0]
-            inverse_edge = vector.GridEdge(edge.b, edge.a)
-            new_loop = [edge, inverse_edge]
-            return False, new_loop
+        else:
+            # we have to add the new_b->edge b
+            new_edge = vector.GridEdge(new_b, edge.b)
+            update_loop.insert(new_edge)
 
-        return loop_expanded, new_loop
+        return True
 
     @staticmethod
     def decompose_edges_into_loops(edges):
-        """ decompose edges into loops """
+        """
+			decompose edges into loops, at every point the loop turns left
+			if possible, otherwise it goes straight or turns right
+		"""
         print("finding loops in %d edges... " % len(edges))
 
         # copy edges and create loop array
         edges = list(edges)
         loops = []
 
-        # create helper dictionary and fill it
+        # create helper dictionary and fill it: it contains the edges
+        # starting at the point which are not yet part of a loop
         edge_from_point = collections.defaultdict(list)
         for edge in edges:
             edge_from_point[edge.a].append(edge)
@@ -218,6 +297,11 @@ class InfluenceMap(map_base.MapBase):
         while edges:
             # get the next best element
             edge = edges.pop()
+            es = edge_from_point[edge.a]
+            # skip it if it is already part of a loop
+            if edge not in es:
+                continue
+            es.remove(edge)
 
             # if we find an edge ending at the start_point, we completed the loop
             start_point = edge.a
@@ -226,7 +310,7 @@ class InfluenceMap(map_base.MapBase):
 
             # we are looking for the next edge
             while edge.b != start_point:
-                # find all edges which start at edge.b (but not end at edge.a)
+                # find all edges which start at edge.b (there are at most four)
                 es = edge_from_point[edge.b]
                 # compute the right facing vector
                 v_right = edge.direction().right()
@@ -236,9 +320,9 @@ class InfluenceMap(map_base.MapBase):
                 valuation = lambda e: v_right * e.direction()
                 edge = min(es, key=valuation)
 
-                # add edge to loop and remove it from the big list
+                # add edge to loop and remove it from the available edges
                 loop.append(edge)
-                edges.remove(edge)
+                es.remove(edge)
 
             # add loop
             loops.append(loop)
@@ -249,6 +333,106 @@ class InfluenceMap(map_base.MapBase):
         return loops
 
     def nearest_area_grid_point_in_sector(self, base, path_a, path_b):
+        """
+			Find the nearest (grid) point to the (grid) point base which lies
+			between the GridPaths path_a and path_b. The sector is spanned
+			clock-wise from path_a to path_b.
+			
+			Careful: the left/right means here left or right from the path as seen from
+					the point base, i.e. the left end of the sector is path_a hence we
+					include everything right of path_a
+			
+			The area ids of the points are precomputed (see AreaMap.get_point_area_ids),
+			nearest_area_grid_point_in_sector_slow is the reference implementation.
+		"""
+        assert (isinstance(base, vector.GridPoint))
+        assert (isinstance(path_a, vector.GridPath))
+        assert (isinstance(path_b, vector.GridPath))
+
+        # compute the tile to the right of path_a[0]->path_a[1]
+        tile_right = vector.GridEdge(path_a.points[0], path_a.points[1]).right_tile()
+        # determine the area id of the right tile
+        if self.contains(tile_right):
+            area_id = self[tile_right]
+        else:
+            area_id = self.area_map.no_area_id + 1  # wall id
+
+        # determine points which are off limit, i.e. left of path_a and right of path_b
+        # again, the perspective we take is from the point base
+
+        off_limit_points_a = self.__points_beside_path(path_a.points, left=True)
+        off_limit_points_b = self.__points_beside_path(path_b.points, left=False)
+
+        # then collect the off limit points. we have to compute them
+        # separately to avoid masking problems
+        off_limit_points = off_limit_points_a | off_limit_points_b
+
+        # the area ids of the points (points outside of the grid belong to the wall)
+        point_area_ids = self.area_map.get_point_area_ids()
+        width, height = self.area_map.width, self.area_map.height
+        wall_id = self.area_map.no_area_id + 1
+
+        # initialise open points, i.e. points which have still to propagate
+        open_points = collections.deque([(base.x, base.y)])
+        # initialise set of all seen points
+        seen_points = set(open_points)
+
+        while open_points:
+            # get a new point (breadth search)
+            x, y = open_points.popleft()
+            # check area_id
+            if 0 <= x <= width and 0 <= y <= height:
+                point_area_id = point_area_ids[x + y * (width + 1)]
+            else:
+                point_area_id = wall_id
+
+            # if the point has the right area_id, then we use it
+            if point_area_id == area_id:
+                # this is only an approximation to the closest point,
+                # but this should be enough
+                return vector.GridPoint(x, y)
+
+            # if the point has an area_id, but the wrong one
+            if point_area_id != self.area_map.no_area_id and point_area_id != area_id:
+                # then skip it except it is one of the early nodes
+                # (there is no harm as this is (almost) entirely an optimisation)
+                if len(seen_points) > 6:
+                    continue
+
+            # propagate (along x-/y-axis, not the diagonal, in the order
+            # of GridPoint.directly_adjacent_points)
+            for new_point in ((x + 1, y), (x, y - 1), (x - 1, y), (x, y + 1)):
+                # if the point is forbidden, leave it
+                if new_point in off_limit_points:
+                    continue
+
+                # propagate the point further (if it is indeed new)
+                if new_point not in seen_points:
+                    open_points.append(new_point)
+                    seen_points.add(new_point)
+
+        raise RuntimeError("Cannot find gate for %s." % base)
+
+    @staticmethod
+    def __points_beside_path(points, left):
+        """
+			the points (as coordinate tuples) of the tiles to the left (or to the right)
+			of the grid path, except for the points on the path
+		"""
+        side_points = set()
+        for p0, p1 in zip(points[:-1], points[1:]):
+            # compute the tile as in GridEdge(p0, p1).left_tile() (or right_tile)
+            dx, dy = p1.x - p0.x, p1.y - p0.y
+            v_x, v_y = (-dy, dx) if left else (dy, -dx)
+            tile_x = min(p0.x, p1.x) + (-1 if v_x == -1 else 0)
+            tile_y = min(p0.y, p1.y) + (-1 if v_y == -1 else 0)
+            # its adjacent points
+            side_points.update(((tile_x, tile_y), (tile_x, tile_y + 1), (tile_x + 1, tile_y + 1), (tile_x + 1, tile_y)))
+        # the points on the line are fine
+        side_points.difference_update((p.x, p.y) for p in points)
+        return side_points
+
+    def nearest_area_grid_point_in_sector_slow(self, base, path_a, path_b):
         """
 			Find the nearest (grid) point to the (grid) point base which lies
 			between the GridPaths path_a and path_b. The sector is spanned
@@ -337,165 +521,196 @@ class InfluenceMap(map_base.MapBase):
         raise RuntimeError("Cannot find gate for %s." % base)
 
 
-class PseudoInPlaceUpdateArray:
+class CyclicUpdateLoop:
     """
-		Helper class which helps with in place updates.
+		Helper class which stores a loop as a cyclic doubly linked list, such
+		that it can be updated in place (no copy of the loop is made).
+		
+		An update walks once around the loop: elements are addressed relative to
+		the current one, which is the first element which was not yet updated.
+		New elements are inserted directly before the current one, hence they are
+		not visited again. The update does not have to visit every element:
+		seek skips elements, which are then confirmed implicitly.
 		
 		Methods:
-		- constructor: Takes the array which is to be updated.
-		- is_finished: Are we finished?
-		- get_array(): If we are finished, get the new array.
-		- length: Compute the length of the total array.
-		- get(rel_pos): rel_pos=0 gets the current element,
-		                i.e. the first which was not yet updated.
+		- constructor: Takes the elements of the loop.
+		- first(): Get the first element of the loop.
+		- get_array(): Get the elements of the loop (starting with the first one).
+		- length: Compute the length of the loop.
+		- begin_update(): Start an update, returns the nodes which have to be
+		                  visited (in the order of the loop), these are all nodes in
+		                  the first update and the nodes inserted in the previous
+		                  update otherwise.
+		- has_pending(): Were nodes inserted in the current update?
+		- is_finished: Are we finished with the update?
+		- seek(node): Make node the current element (returns False if it was deleted).
+		- get(rel_pos): rel_pos=0 gets the current element.
 		- delete(rel_pos): Deletes the requested element.
 		- insert(new_element): Insert new_element directly before the current one.
-		- confirm: confirm the current element
+		- confirm: Confirm the current element, i.e. go to the next element.
+		
+		The first element of the loop is the first updated element (or the current
+		one if no element was updated yet), i.e. the loop is new elements followed
+		by the elements which were not yet updated.
 	"""
 
     def __init__(self, array):
-        self._old_array = array
-        self._new_array = []
+        self._head = None
+        self._length = 0
+        # the current element and if it wrapped around, i.e. if all elements were updated
+        self._cursor = None
+        self._wrapped = False
 
-        self._old_array_range_start = 0
-        self._old_array_range_end = len(self._old_array)
+        # the nodes which have to be visited in the next update
+        self._pending = []
 
-    def is_finished(self):
+        for element in array:
+            self._cursor = self._head
+            self._wrapped = True
+            self.insert(element)
+
+    def first(self):
         """
-			Is the update finished?
+			Get the first element of the loop.
 		"""
-        # we are finished when the there are no more new elements
-        return self._old_array_range_start >= self._old_array_range_end
+        return self._head.element
 
     def get_array(self):
         """
-			Return the new array if we are finished.
+			Return the elements of the loop (starting with the first one).
 		"""
-        assert (self.is_finished())
-        return self._new_array
+        array = []
+        node = self._head
+        for _ in range(self._length):
+            array.append(node.element)
+            node = node.next
+        return array
 
     def length(self):
         """
-			Compute the length of the total array.
+			Compute the length of the loop.
 		"""
-        return len(self._new_array) + self._old_array_range_end - self._old_array_range_start
+        return self._length
 
-    def _rel_abs_position(self, rel_pos):
+    def begin_update(self):
         """
-			Compute the absolute position which corresponds to rel_pos.
-			The array is indexed as we would have a long array
-			new_array + old_array[start:end].
-			
-			Example:
-				old_array = [d,e,f]
-				new_array = [a,b,c]
-				start = 1
-				end = 3
-				[local variable array_length=5]
-				_rel_abs_position:
-					-2 -> 1
-					-1 -> 2
-					0  -> 3
-					1  -> 4
-					2  -> 0
+			Start a new update and return the nodes which have to be visited.
+		"""
+        nodes, self._pending = self._pending, []
+        self._cursor = self._head
+        self._wrapped = False
+        return nodes
+
+    def has_pending(self):
+        """
+			Were nodes inserted in the current update?
+		"""
+        return bool(self._pending)
+
+    def is_finished(self):
+        """
+			Is the update finished?
 		"""
-        # compute the length of the total array
-        array_length = self.length()
-        # compute the position in the total array
-        abs_pos = len(self._new_array) + rel_pos
-        # normalise the position
-        return abs_pos % array_length
+        return self._cursor is None or self._wrapped
+
+    def confirm(self):
+        """
+			Confirm the current element.
+		"""
+        assert (not self.is_finished())
+        self._cursor = self._cursor.next
+        # we wrapped around if we are back at the first element
+        if self._cursor is self._head:
+            self._wrapped = True
+
+    def seek(self, node):
+        """
+			Make node the current element, all elements between the old and
+			the new current element are confirmed. Returns False if the node
+			was already deleted.
+		"""
+        if node.next is None:
+            return False
+        self._cursor = node
+        return True
+
+    def _node(self, rel_pos):
+        """
+			Get the node relative to the current one.
+		"""
+        node = self._cursor
+        for _ in range(rel_pos):
+            node = node.next
+        for _ in range(-rel_pos):
+            node = node.prev
+        return node
 
     def get(self, rel_pos):
         """
 			Get the element, it is addressed relative to the current one,
-			which is the first element which was not yet updated.
-
-			Example:
-				old_array = [d,e,f]
-				new_array = [a,b,c]
-				start = 1
-				end = 3
-
-				get:
-					-2 -> abs_pos=1, if branch, 'b'
-					-1 -> abs_pos=2, if branch, 'c'
-					0  -> abs_pos=3, else branch, pos = 3-3+1=1, 'e'
-					1  -> abs_pos=4, else branch, pos = 4-3+1=2, 'f'
-					2  -> abs_pos=0, if branch, 'a'
+			the loop is cyclic, e.g. get(-1) is the element before the current one.
 		"""
-        abs_pos = self._rel_abs_position(rel_pos)
-        # get the element by the absolute position
-        if abs_pos < len(self._new_array):
-            # the element is in the new array
-            return self._new_array[abs_pos]
-        else:
-            # the element is in the old array
-            pos = (abs_pos - len(self._new_array)) + self._old_array_range_start
-            return self._old_array[pos]
+        return self._node(rel_pos).element
 
     def delete(self, rel_pos):
         """
 			Delete the element.
-
-			Example:
-				old_array = [d,e,f,g]
-				new_array = [a,b,c]
-				start = 1
-				end = 4
-
-				get:
-					-2 -> abs_pos=1, if branch, 'b'
-					-1 -> abs_pos=2, if branch, 'c'
-					0  -> abs_pos=3, else branch, pos = 3-3+1=1, if branch
-					1  -> abs_pos=4, else branch, pos = 4-3+1=2, else branch
-					2  -> abs_pos=5, else branch, pos = 5-3+1=3, elif branch
-					3  -> abs_pos=0, if branch, 'a'
 		"""
-        abs_pos = self._rel_abs_position(rel_pos)
-        # find the element by the absolute position
-        if abs_pos < len(self._new_array):
-            # the element is in the new array:
-            # indeed, delete it
-            del self._new_array[abs_pos]
+        node = self._node(rel_pos)
+        self._length -= 1
+
+        if self._length == 0:
+            self._head = self._cursor = None
         else:
-            # the element is in the old array:
-            # don't delete it, just mask the position
-            pos = (abs_pos - len(self._new_array)) + self._old_array_range_start
-            if pos == self._old_array_range_start:
-                # advance start
-                self._old_array_range_start += 1
-            elif pos == self._old_array_range_end - 1:
-                # advance end
-                self._old_array_range_end -= 1
-            else:
-                print("rel_pos:", rel_pos)
-                print("len(self._old_array):", len(self._old_array))
-                print("len(self._new_array):", len(self._new_array))
-                print("abs_pos:", abs_pos)
-                print("pos:", pos)
-                print("self._old_array_range_start:", self._old_array_range_start)
-                print("self._old_array_range_end:", self._old_array_range_end)
-                raise ValueError("delete improperly used")
-            assert (self._old_array_range_start <= self._old_array_range_end)
+            node.prev.next = node.next
+            node.next.prev = node.prev
+
+            if node is self._cursor:
+                # the next element becomes the current one, if the current
+                # element was the last one which was not yet updated, we wrapped around
+                if node is self._head:
+                    self._head = node.next
+                elif node.next is self._head:
+                    self._wrapped = True
+                self._cursor = node.next
+            elif node is self._head:
+                self._head = node.next
+
+        # mark the node as deleted
+        node.prev = node.next = None
 
     def insert(self, new_element):
         """
 			Insert new_element directly before the current one.
 		"""
-        self._new_array.append(new_element)
+        node = _LoopNode(new_element)
+        self._pending.append(node)
+        self._length += 1
 
-    def confirm(self):
-        """
-			Confirm the current element. Equivalent to:
-			x = array.get(0)
-			array.delete(0)
-			array.insert(x)
-		"""
-        assert (not self.is_finished())
-        # get the element
-        element = self._old_array[self._old_array_range_start]
-        # delete it
-        self._old_array_range_start += 1
-        # add it to the new array
-        self._new_array.append(element)
+        if self._cursor is None:
+            # the loop was empty
+            node.prev = node.next = node
+            self._head = self._cursor = node
+            self._wrapped = True
+            return
+
+        node.prev = self._cursor.prev
+        node.next = self._cursor
+        node.prev.next = node
+        self._cursor.prev = node
+
+        # if no element was updated yet, the new element is the first one
+        if self._cursor is self._head and not self._wrapped:
+            self._head = node
+
+
+class _LoopNode:
+    """
+		A node of CyclicUpdateLoop.
+	"""
+    __slots__ = ('element', 'prev', 'next')
+
+    def __init__(self, element):
+        self.element = element
+        self.prev = None
+        self.next = None
@@ -1,13 +1,49 @@
+import itertools
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from geometry import halfplane, vector
 
 
 class MapBase:
+    """
+        Base class of all maps. The data is stored row by row in a flat sequence,
+        i.e. the value of the tile (x,y) is data[x + y * width].
+
+        data may be any flat sequence (e.g. a list or a buffer), alternatively
+        a NumPy array can be given (array-backed mode). In the latter case,
+        data is a flat view and array is a 2-D view (array[y, x]) of the same
+        memory. The bulk accessors (get_row, set_row, fill_row, get_values,
+        set_values, assign_where) work in both modes, but they are only
+        vectorized in the array-backed mode.
+    """
+
     def __init__(self, width, height, data):
         self.width = width
         self.height = height
-        self.data = data
+
+        if numpy is not None and isinstance(data, numpy.ndarray):
+            # array-backed mode
+            self.data = data.reshape(-1)
+            self.array = data.reshape(height, width)
+        else:
+            self.data = data
+            self.array = None
+
+    def is_array_backed(self):
+        """ is the data stored in a NumPy array? """
+        return numpy is not None and isinstance(self.data, numpy.ndarray)
+
+    def copy_data(self):
+        """ create a (writable) copy of the data in the same storage mode """
+        if self.is_array_backed():
+            return self.array.copy()
+        else:
+            return list(self.data)
 
     def contains(self, obj):
         """ does the current map contain the point/tile? """
@@ -34,9 +70,86 @@ class MapBase:
         index = i.x + i.y * self.width
         self.data[index] = v
 
+    def get_row(self, y, x_start=0, x_end=None):
+        """
+            get the values of the tiles (x_start,y),...,(x_end-1,y)
+            (in the array-backed mode this is a view, otherwise a copy)
+        """
+        if x_end is None:
+            x_end = self.width
+        index = y * self.width
+        return self.data[index + x_start:index + x_end]
+
+    def set_row(self, y, x_start, values):
+        """ set the values of the tiles (x_start,y),...,(x_start+len(values)-1,y) """
+        index = y * self.width + x_start
+        self.data[index:index + len(values)] = values
+
+    def fill_row(self, y, x_start, x_end, value):
+        """ set the tiles (x_start,y),...,(x_end-1,y) to value """
+        index = y * self.width
+        if self.is_array_backed():
+            self.data[index + x_start:index + x_end] = value
+        else:
+            self.data[index + x_start:index + x_end] = [value] * (x_end - x_start)
+
+    def get_values(self, xs, ys):
+        """ get the values of the tiles (xs[i],ys[i]) """
+        if self.is_array_backed():
+            return self.array[numpy.asarray(ys), numpy.asarray(xs)]
+        else:
+            data, width = self.data, self.width
+            return [data[x + y * width] for x, y in zip(xs, ys)]
+
+    def set_values(self, xs, ys, values):
+        """ set the values of the tiles (xs[i],ys[i]) to values[i] (or values if it is a scalar) """
+        if self.is_array_backed():
+            self.array[numpy.asarray(ys), numpy.asarray(xs)] = values
+        else:
+            data, width = self.data, self.width
+            if not hasattr(values, "__len__"):
+                values = itertools.repeat(values)
+            for x, y, v in zip(xs, ys, values):
+                data[x + y * width] = v
+
+    def assign_where(self, mask, value):
+        """
+            set all tiles to value for which mask is true,
+            mask is a flat sequence (or a NumPy array) of the map's size
+        """
+        if self.is_array_backed():
+            self.data[numpy.asarray(mask, dtype=bool).reshape(-1)] = value
+        else:
+            data = self.data
+            for index in itertools.compress(range(len(data)), mask):
+                data[index] = value
+
     @staticmethod
     def find_gridpoints_in_triangle_iterator(a, b, c):
         """ find all grid points in the triangle defined by the three points """
+        for y, x_start, x_end in MapBase._gridpoint_spans_in_triangle(a, b, c):
+            for i in range(x_start, x_end):
+                yield vector.GridPoint(i, y)
+
+    def find_gridpoint_spans_in_triangle_iterator(self, a, b, c):
+        """
+            find all grid points in the triangle defined by the three points,
+            the points are returned row by row as (y, x_start, x_end), i.e.
+            the points (x_start,y),...,(x_end-1,y), clipped to the map
+        """
+        for y, x_start, x_end in self._gridpoint_spans_in_triangle(a, b, c):
+            if not 0 <= y <= self.height:
+                continue
+            x_start, x_end = max(x_start, 0), min(x_end, self.width + 1)
+            if x_start < x_end:
+                yield y, x_start, x_end
+
+    @staticmethod
+    def _gridpoint_spans_in_triangle(a, b, c):
+        """
+            find all grid points in the triangle defined by the three points,
+            the points are returned row by row as (y, x_start, x_end) (not clipped to the map)
+        """
 
         assert (isinstance(a, vector.PointF))
         assert (isinstance(b, vector.PointF))
@@ -95,9 +208,9 @@ class MapBase:
             i1 = eps_ceil(x1)
             i2 = eps_floor(x2)
 
-            # communicate the vector
-            for i in range(i1, i2 + 1):
-                yield vector.GridPoint(i, y)
+            # communicate the points
+            if i1 <= i2:
+                yield y, i1, i2 + 1
 
             # increase y
             y += 1
@@ -126,15 +239,38 @@ class MapBase:
             i1 = eps_ceil(x1)
             i2 = eps_floor(x2)
 
-            # communicate the vector
-            for i in range(i1, i2 + 1):
-                yield vector.GridPoint(i, y)
+            # communicate the points
+            if i1 <= i2:
+                yield y, i1, i2 + 1
 
             # increase y
             y += 1
 
     def find_tiles_in_triangle_iterator(self, a, b, c):
         """ find all tiles in the triangle defined by the three points """
+        for y, x_start, x_end in self.find_tile_spans_in_triangle_iterator(a, b, c):
+            for i in range(x_start, x_end):
+                yield vector.GridTile(i, y)
+
+    def find_tile_spans_in_triangle_iterator(self, a, b, c):
+        """
+            find all tiles in the triangle defined by the three points,
+            the tiles are returned row by row as (y, x_start, x_end), i.e.
+            the tiles (x_start,y),...,(x_end-1,y), clipped to the map
+        """
+        for y, x_start, x_end in self._tile_spans_in_triangle(a, b, c):
+            if not 0 <= y < self.height:
+                continue
+            x_start, x_end = max(x_start, 0), min(x_end, self.width)
+            if x_start < x_end:
+                yield y, x_start, x_end
+
+    @staticmethod
+    def _tile_spans_in_triangle(a, b, c):
+        """
+            find all tiles in the triangle defined by the three points,
+            the tiles are returned row by row as (y, x_start, x_end) (not clipped to the map)
+        """
 
         assert (isinstance(a, vector.PointF))
         assert (isinstance(b, vector.PointF))
@@ -228,11 +364,8 @@ class MapBase:
             i_min = min(lower_x_min, upper_x_min)
             i_max = max(lower_x_max, upper_x_max)
 
-            # communicate the tile
-            for i in range(i_min, i_max):
-                tile = vector.GridTile(i, y)
-                if self.contains(tile):
-                    yield tile
+            # communicate the tiles
+            yield y, i_min, i_max
 
             # swap upper to lower
             lower_x_min, lower_x_max = upper_x_min, upper_x_max
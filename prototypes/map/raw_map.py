@@ -1,41 +1,231 @@
+import array
+import mmap
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from map import map_base
 
 
 class RawMap(map_base.MapBase):
+    """
+        The raw (pixel) map as read from a PGM file.
+
+        If the map was read from a file, data is a read-only buffer which is
+        backed by a memory map of the file, hence no copy of the payload is made.
+        Furthermore, array is a 2-D NumPy view of the same buffer if NumPy is
+        available and None otherwise.
+    """
+
+    def __init__(self, width, height, data, max_value=255):
+        super(RawMap, self).__init__(width, height, data)
+        # the maximal pixel value as announced in the header
+        self.max_value = max_value
+        # the memory map backing data (if read from a file)
+        self._mmap = None
+
+    def content_buffer(self):
+        """ the pixel data as an object supporting the buffer protocol (e.g. for hashing) """
+        if isinstance(self.data, UInt16BigEndianBuffer):
+            return self.data.buffer
+        try:
+            return memoryview(self.data)
+        except TypeError:
+            # a general sequence
+            return array.array('I', self.data)
+
+    def value_range(self):
+        """ the minimal and the maximal pixel value of the data ((0, 0) if the map is empty) """
+        if self.width * self.height == 0:
+            return 0, 0
+        if self.array is not None:
+            return int(self.array.min()), int(self.array.max())
+        return min(self.data), max(self.data)
+
+    def compile_pass_test(self, pass_test):
+        """
+            compile the function pass_test (pixel value -> is the tile passable?)
+            into a lookup table: table[value] is 1 if the tile is passable and 0 otherwise.
+            the table covers the values up to max_value and all values of the data.
+        """
+        min_value, max_value = self.value_range()
+        if min_value < 0:
+            raise ValueError("Negative pixel value %d." % min_value)
+        return bytes(bool(pass_test(value)) for value in range(max(self.max_value, max_value) + 1))
+
+    def passability_mask(self, pass_table):
+        """
+            convert the map with the lookup table (see compile_pass_test) into the
+            passability mask, i.e. mask[x + y * width] is 1 if the tile (x,y) is
+            passable and 0 otherwise. the conversion is done in one pass.
+        """
+        count = self.width * self.height
+
+        if self.array is not None:
+            # use NumPy if possible
+            table = numpy.frombuffer(pass_table, dtype=numpy.uint8)
+            return table[self.array].tobytes()
+
+        if isinstance(self.data, (memoryview, bytes, bytearray)) and self.max_value < 256:
+            # one byte per pixel: translate the buffer chunk by chunk
+            # (translate needs a table with 256 entries)
+            table = pass_table + bytes(256 - len(pass_table))
+            mask = bytearray()
+            chunk_size = 1 << 20
+            for start in range(0, count, chunk_size):
+                mask += bytes(self.data[start:start + chunk_size]).translate(table)
+            return bytes(mask)
+
+        # general case
+        return bytes(pass_table[value] for value in self.data)
+
+    @staticmethod
+    def _read_header(buffer):
+        """
+            parse the header of a PGM file, returns the tuple
+            (version, width, height, max_value, data_offset)
+        """
+        tokens = []
+        pos = 0
+        size = len(buffer)
+
+        # the header consists of 4 tokens separated by whitespace,
+        # comments start with '#' and last until the end of the line
+        while len(tokens) != 4:
+            # skip whitespace and comments
+            while pos < size:
+                if buffer[pos:pos + 1] == b'#':
+                    end_of_line = buffer.find(b'\n', pos)
+                    pos = end_of_line + 1 if end_of_line != -1 else size
+                elif buffer[pos:pos + 1].isspace():
+                    pos += 1
+                else:
+                    break
+
+            if pos >= size:
+                raise ValueError("Truncated PGM header.")
+
+            # read the token
+            start = pos
+            while pos < size and not buffer[pos:pos + 1].isspace() and buffer[pos:pos + 1] != b'#':
+                pos += 1
+            tokens.append(bytes(buffer[start:pos]))
+
+        # exactly one whitespace character separates the header from the data
+        data_offset = pos + 1
+
+        version, width, height, max_value = tokens
+        return version, int(width), int(height), int(max_value), data_offset
+
+    @staticmethod
+    def _read_ascii_data(buffer, offset, count, max_value):
+        """
+            decode the ASCII (P2) payload chunk by chunk into a compact array,
+            the file content itself is never copied as a whole. the array is
+            widened if a value exceeds max_value (and the item size).
+        """
+        data = array.array('B' if max_value < 256 else 'H')
+        chunk_size = 1 << 20
+
+        def extend(values):
+            nonlocal data
+            values = [int(value) for value in values]
+            if values and max(values) >> (8 * data.itemsize):
+                data = array.array('I', data)
+            data.extend(values)
+
+        # unfinished token of the previous chunk
+        rest = b''
+        pos = offset
+        while pos < len(buffer):
+            chunk = rest + buffer[pos:pos + chunk_size]
+            pos += chunk_size
+
+            tokens = chunk.split()
+            # the last token may continue in the next chunk
+            if pos < len(buffer) and tokens and not chunk[-1:].isspace():
+                rest = tokens.pop()
+            else:
+                rest = b''
+            extend(tokens)
+
+        if rest:
+            extend([rest])
+
+        if len(data) != count:
+            raise ValueError("Expected %d pixel values, found %d." % (count, len(data)))
+        return data
+
     @staticmethod
     def read(path):
-        """ read the map """
-        height, width = 0, 0
-        # open source in binary read mode and open destination in binary write mode
+        """ read the map (formats P5 and P2, 8- and 16-bit) """
+        # map the file read-only into memory
         with open(path, "rb") as f:
-            # read the first 3+x lines
-            read_lines = 0
-            while read_lines != 3:
-                line = f.readline()
-
-                # ignore comments
-                if line.startswith(b'#'):
-                    continue
-
-                # first line is the version
-                if read_lines == 0:
-                    version = line.strip()
-                    assert (version == b"P5")
-                # second line is width and height
-                if read_lines == 1:
-                    width, height = line.strip().split(b" ")
-                    width, height = int(width), int(height)
-                # third line is the max pixel value
-                if read_lines == 2:
-                    max_value = line.strip()
-
-                # increment read line counter
-                read_lines += 1
-
-            # after that, all is data
-            data = f.read()
-
-        assert (len(data) == width * height)
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        version, width, height, max_value, offset = RawMap._read_header(buffer)
+        assert (version in (b"P5", b"P2"))
+        assert (0 < max_value < 65536)
+        count = width * height
+
+        if version == b"P2":
+            data = RawMap._read_ascii_data(buffer, offset, count, max_value)
+            dtype = 'u%d' % data.itemsize
+            array_source, array_offset = data, 0
+        elif max_value < 256:
+            # one byte per pixel: a memoryview of the map is already a valid buffer
+            data = memoryview(buffer)[offset:offset + count]
+            dtype = 'u1'
+            array_source, array_offset = buffer, offset
+        else:
+            # two bytes per pixel, most significant byte first
+            data = UInt16BigEndianBuffer(memoryview(buffer)[offset:offset + 2 * count])
+            dtype = '>u2'
+            array_source, array_offset = buffer, offset
+
+        assert (len(data) == count)
 
         # return interesting data
-        return RawMap(width, height, data)
+        raw_map = RawMap(width, height, data, max_value)
+        raw_map._mmap = buffer
+
+        # create a NumPy view (without copying) if possible,
+        # the data itself stays the (more general) buffer
+        if numpy is not None:
+            raw_map.array = numpy.frombuffer(array_source, dtype=dtype, count=count,
+                                             offset=array_offset).reshape(height, width)
+
+        return raw_map
+
+
+class UInt16BigEndianBuffer:
+    """
+        Read-only sequence view of a buffer of big endian 16-bit unsigned integers
+        (the byte order used by 16-bit PGM files).
+    """
+
+    def __init__(self, buffer):
+        assert (len(buffer) % 2 == 0)
+        # the underlying buffer
+        self.buffer = buffer
+        # on big endian machines we can use the buffer directly
+        self._native = buffer.cast('H') if sys.byteorder == 'big' else None
+
+    def __len__(self):
+        return len(self.buffer) // 2
+
+    def __getitem__(self, i):
+        if self._native is not None:
+            return self._native[i]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index out of range")
+        return (self.buffer[2 * i] << 8) | self.buffer[2 * i + 1]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -10,8 +10,6 @@ from PyQt4 import uic
 from map import raw_map
 import pf_data
 
-import pf_shortest_path
-
 if sys.version_info < (3, 2, 0):
     raise RuntimeError("Python version >= 3.2 is needed.")
 
@@ -236,9 +234,8 @@ class MainWindow(QtGui.QMainWindow):
         self.label_ouput.setText("searching...")
 
         if self.preprocessed.shortest_path.n != n:
-            self.preprocessed.shortest_path \
-                = pf_shortest_path.ShortestPathSearch(self.preprocessed.graph,
-                                                      self.preprocessed.area_map, n)
+            # the dictionary is extended (or reduced) in place
+            self.preprocessed.shortest_path.set_n(n)
 
         # search path
         a = time.time()
@@ -1,29 +1,106 @@
+import pickle
+
 from map import area_map, influence_map
 from graph import graph
 import pf_shortest_path
+import pf_snapshot
 
 
 class PathFindingData:
 	"""
 		Holds all the preprocessed data.
 	"""
-	def __init__(self, raw_map, pass_test, precomputed_hops=1):
-		""" pass_test is a function which tests if a tile is unpassable """
+	def __init__(self, raw_map, pass_test, precomputed_hops=1, cache_dir=None, workers=1,
+				 lazy_hops=False, hop_cache_size=None):
+		"""
+			pass_test is a function which tests if a tile is passable.
+			if cache_dir is given, the preprocessed data is stored there
+			as snapshot and reused by later instances (see pf_snapshot).
+			workers is the number of worker processes used by the preprocessing
+			(None means one per CPU, see pf_parallel).
+			if lazy_hops is true, the n-hop dictionary is filled on demand and
+			holds at most hop_cache_size entries (see NHopDictionary)
+		"""
 		self.raw_map = raw_map
 		self.pass_test = pass_test
 		self.precomputed_hops = precomputed_hops
+		self.cache_dir = cache_dir
+		self.workers = workers
+		self.lazy_hops = lazy_hops
+		self.hop_cache_size = hop_cache_size
+		
+		# compile the pass test into a lookup table (pixel value -> passable?)
+		self.pass_table = self.raw_map.compile_pass_test(self.pass_test)
+		
+		# was the data loaded from a snapshot?
+		self.loaded_from_snapshot = False
+		
+		if self.cache_dir is None:
+			self._preprocess_map()
+		else:
+			self._preprocess_map_cached()
+	
+	def _preprocess_map_cached(self):
+		""" load the preprocessed data from the snapshot or create (and save) it """
+		key = pf_snapshot.snapshot_key(self.raw_map, self.pass_table, self.precomputed_hops)
+		path = pf_snapshot.snapshot_path(self.cache_dir, key)
 		
+		snapshot = pf_snapshot.load_snapshot(path, key)
+		if snapshot is not None:
+			print("loaded preprocessed data from %s" % path)
+			self._restore_snapshot(snapshot)
+			self.loaded_from_snapshot = True
+			return
+		
+		# the snapshot does not exist or is stale
 		self._preprocess_map()
 		
+		# a failed save does not affect the preprocessed data
+		try:
+			pf_snapshot.save_snapshot(path, key, self._create_snapshot())
+		except (OSError, pickle.PicklingError) as e:
+			print("could not save preprocessed data to %s: %s" % (path, e))
+		else:
+			print("saved preprocessed data to %s" % path)
+	
+	def _create_snapshot(self):
+		""" collect all preprocessed data """
+		return {
+			"area_map": self.area_map,
+			"influence_map": self.influence_map,
+			"graph": self.graph,
+			"n_hop_dict": self.shortest_path._n_hop_dict,
+		}
+	
+	def _restore_snapshot(self, snapshot):
+		""" restore all preprocessed data """
+		self.area_map = snapshot["area_map"]
+		self.influence_map = snapshot["influence_map"]
+		self.graph = snapshot["graph"]
+		# the raw map and the pass test are not part of the snapshot
+		self.area_map.raw_map = self.raw_map
+		self.area_map.pass_test = self.pass_table
+		# create shortest path search with the precomputed dictionary (if it was created in the same mode)
+		n_hop_dict = snapshot["n_hop_dict"]
+		if n_hop_dict.lazy != self.lazy_hops:
+			n_hop_dict = None
+		elif self.lazy_hops:
+			n_hop_dict.cache_size = self.hop_cache_size
+		self.shortest_path = pf_shortest_path.ShortestPathSearch(self.graph, self.area_map, self.precomputed_hops,
+																 n_hop_dict, self.workers,
+																 self.lazy_hops, self.hop_cache_size)
+	
 	def _preprocess_map(self):
 		# create the area map
-		self.area_map = area_map.AreaMap(self.raw_map, self.pass_test)
+		self.area_map = area_map.AreaMap(self.raw_map, self.pass_table)
 		# create the influence map
 		self.influence_map = influence_map.InfluenceMap(self.area_map)
 		# create the graph
-		self.graph = graph.Graph(self.area_map, self.influence_map)
+		self.graph = graph.Graph(self.area_map, self.influence_map, self.workers)
 		# create shortest path search
-		self.shortest_path = pf_shortest_path.ShortestPathSearch(self.graph, self.area_map, self.precomputed_hops)
+		self.shortest_path = pf_shortest_path.ShortestPathSearch(self.graph, self.area_map, self.precomputed_hops,
+																 workers=self.workers, lazy=self.lazy_hops,
+																 cache_size=self.hop_cache_size)
 	
 
 
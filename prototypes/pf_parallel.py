@@ -0,0 +1,63 @@
+"""
+    Run independent preprocessing tasks in worker processes.
+
+    The workers are forked, hence they share the (read-only) preprocessed data
+    with the parent process (copy-on-write), only the results are pickled.
+    If fork is not available or only one worker is requested, the tasks
+    are run in the current process.
+"""
+import multiprocessing
+import os
+
+# (function, shared, chunks) of the running map_chunks call, inherited by the workers
+_task = None
+
+
+def worker_count(workers):
+    """ the number of workers to use: None means one worker per CPU """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+def can_fork():
+    """ can the workers be forked? """
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def split_into_chunks(items, chunk_count):
+    """ split the list into (at most) chunk_count chunks of consecutive items """
+    chunk_count = max(1, min(chunk_count, len(items)))
+    size, rest = divmod(len(items), chunk_count)
+    chunks = []
+    start = 0
+    for i in range(chunk_count):
+        end = start + size + (1 if i < rest else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def _run_chunk(index):
+    """ run the task on the chunk with the given index (in the worker) """
+    function, shared, chunks = _task
+    return function(shared, chunks[index])
+
+
+def map_chunks(function, shared, chunks, workers):
+    """
+        compute [function(shared, chunk) for chunk in chunks] with the given
+        number of workers. the results are returned in the order of the chunks.
+    """
+    global _task
+
+    workers = min(worker_count(workers), len(chunks))
+    if workers <= 1 or not can_fork():
+        return [function(shared, chunk) for chunk in chunks]
+
+    _task = (function, shared, chunks)
+    try:
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            return pool.map(_run_chunk, range(len(chunks)), chunksize=1)
+    finally:
+        _task = None
@@ -1,16 +1,33 @@
+import collections
+
 from geometry import vector
 from graph import shortest_path, graph
+import pf_parallel
 
 
 class ShortestPathSearch:
-    def __init__(self, graph, area_map, n):
+    def __init__(self, graph, area_map, n, n_hop_dict=None, workers=1, lazy=False, cache_size=None):
+        """
+            n_hop_dict is an already built NHopDictionary (optional),
+            otherwise it is built with the given number of worker processes
+            (or lazily with the given cache size, see NHopDictionary)
+        """
         self.graph = graph
         self.area_map = area_map
         self.n = n
+        self._n_hop_dict = n_hop_dict
+        self.workers = workers
+        self.lazy = lazy
+        self.cache_size = cache_size
 
         # create finder
         self._create()
 
+    def set_n(self, n):
+        """ change the maximal number of hops of the estimates (see NHopDictionary.set_n) """
+        self._n_hop_dict.set_n(n)
+        self.n = n
+
     def _create(self):
         """ create shortest path finder """
 
@@ -19,16 +36,16 @@ class ShortestPathSearch:
         #   one edge to a non-connectivity node. (this definition is unstable,
         #   (as order dependent) but in this context OK
 
-        self._n_hop_dict = NHopDictionary(self.graph, self.area_map, self.n)
+        if self._n_hop_dict is None:
+            self._n_hop_dict = NHopDictionary(self.graph, self.area_map, self.n, self.workers,
+                                              self.lazy, self.cache_size)
+        assert (self._n_hop_dict.n == self.n)
 
         def get_edges(node):
             return node.directional_edges()
 
         def exact_eval(path):
-            path = sum([edge.opt_path().points for edge in path.edges()], [])
-            path = vector.PathF(path)
-            opt = self.area_map.optimise_path(path)
-            return opt.length()
+            return self._optimised_path(path).length()
 
         def range_eval(path):
             # c = len(path.edges())
@@ -69,9 +86,7 @@ class ShortestPathSearch:
                 else:
                     break
 
-            # set c_min/c_max
-            path.c_min = c_min
-            path.c_max = c_max
+            # (the finder caches the result in path.c_min/c_max)
             return (c_min, c_max)
 
         self.finder = shortest_path.ShortestPathFinder(
@@ -80,6 +95,29 @@ class ShortestPathSearch:
             exact_eval,
             range_eval)
 
+    def _optimised_path(self, path):
+        """
+            find the optimised geometry of the path, it is cached in path.exact_data
+            and computed from the cached geometry of the parent path
+        """
+        # find the paths without cached geometry (path first)
+        missing = []
+        current = path
+        while current is not None and current.exact_data is None:
+            missing.append(current)
+            current = current.parent()
+
+        # compute them, parents first
+        for current in reversed(missing):
+            parent = current.parent()
+            edge_path = current.last_edge().opt_path()
+            if parent is None:
+                current.exact_data = self.area_map.optimise_path(edge_path)
+            else:
+                current.exact_data = self.area_map.extend_optimised_path(parent.exact_data, edge_path)
+
+        return path.exact_data
+
     def find_path_between_nodes(self, start, end):
         """ find the best path between the two points """
         assert (isinstance(start, graph.GraphNode))
@@ -88,13 +126,8 @@ class ShortestPathSearch:
         # find the shortest path
         path = self.finder.find_path(start, end)
 
-        # convert it to PathF and maximise (not very optimised version)
-        opt_path = sum([edge.opt_path().points for edge in path.edges()], [])
-        opt_path = vector.PathF(opt_path)
-        opt_path = self.area_map.optimise_path(opt_path)
-
-        # and return it
-        return opt_path
+        # return its optimised geometry (usually already computed by exact_eval)
+        return self._optimised_path(path)
 
     def find_path(self, start, end):
         """ find the best path between the two points """
@@ -110,32 +143,58 @@ class NHopDictionary:
 		of nodes which are max n hops apart
 	"""
 
-    def __init__(self, graph, area_map, n):
+    def __init__(self, graph, area_map, n, workers=1, lazy=False, cache_size=None):
+        """
+            the dictionary is built by the given number of worker processes
+            (None means one per CPU, see pf_parallel).
+
+            if lazy is true, the entries are computed when they are requested
+            and at most cache_size entries (None means no limit) are kept,
+            the least recently used entries are dropped first. the number of
+            hits, misses and evictions is counted, query_counts counts the
+            requests per key of the cached entries (see most_frequent_keys
+            and warm_up), the count is dropped with the entry.
+        """
         self.graph = graph
         self.area_map = area_map
         self.n = n
+        self.workers = workers
+        self.lazy = lazy
+        self.cache_size = cache_size
         # saves the min/max length of the path
         self._map_length = {}
-        # saves the opt_path for the path
-        self._map_opt_path = {}
+        # saves the opt_path for the path (in the lazy mode in the order of use)
+        self._map_opt_path = collections.OrderedDict() if self.lazy else {}
+
+        # statistics of the lazy mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.query_counts = collections.Counter()
 
         # build it
-        self._build()
+        if not self.lazy:
+            self._build()
 
     def create_key(self, edges):
         """
 			create and canonicalise key,
-			the key is the tuple of the edge ids
+			the key is the tuple of the (integer) edge ids
 			and the lower end starts direction
 		"""
-        for edge in edges:
-            assert (isinstance(edge, graph.DirectionalGraphEdge))
-        key = tuple(edge._graph_edge.edge_id(self.graph) for edge in edges)
-        return key if key[0] <= key[-1] else tuple(reversed(key))
+        key = tuple([edge.edge_id for edge in edges])
+        return key if key[0] <= key[-1] else key[::-1]
 
     def optimal_path(self, edges):
         """ find the optimal path """
         key = self.create_key(edges)
+        if self.lazy:
+            self.query_counts[key] += 1
+            self._request(key)
+        return self._oriented_opt_path(key, edges)
+
+    def _oriented_opt_path(self, key, edges):
+        """ the saved optimal path of the key in the direction of the edges """
         opt_path = self._map_opt_path[key]
 
         start = edges[0].start().position.toPointF()
@@ -153,62 +212,206 @@ class NHopDictionary:
     def length_estimation(self, edges):
         """ get a length estimation """
         key = self.create_key(edges)
+        if self.lazy:
+            self.query_counts[key] += 1
+            self._request(key)
         return self._map_length[key]
 
-    def _build_helper(self, edges):
-        """ helper method: expand nodes """
-
-        # if the nodes list is already too long, ignore it
-        if len(edges) > self.n:
+    def _request(self, key):
+        """ lazy mode: make sure that the entry of the key exists (and update the statistics) """
+        if key in self._map_opt_path:
+            self.hits += 1
+            self._map_opt_path.move_to_end(key)
             return
 
-        # get the old optimal path
-        if len(edges) != 1:
-            old_opt_path = self.optimal_path(edges[:-1])
+        self.misses += 1
+        # the entry is computed from the same walk as in the full build,
+        # hence it does not depend on the order of the requests
+        self._add_entry(key, self._first_walk(key))
+
+        # drop the least recently used entries
+        while self.cache_size is not None and len(self._map_opt_path) > max(self.cache_size, 1):
+            old_key, _ = self._map_opt_path.popitem(last=False)
+            del self._map_length[old_key]
+            self.query_counts.pop(old_key, None)
+            self.evictions += 1
+
+    def _first_walk(self, key):
+        """
+            the directional edges of the key in the direction of the first visit
+            of the full build (see _first_walks): it starts at the end node
+            with the lower node id
+        """
+        edges = [self.graph.edges[edge_id] for edge_id in key]
+        first, last = edges[0], edges[-1]
+        if len(edges) == 1:
+            start = min(first.node_a, first.node_b, key=lambda node: node.node_id)
+        elif first.node_a == first.node_b:
+            # a walk can only start with a loop edge
+            start = first.node_a
+        elif last.node_a == last.node_b:
+            start = last.node_a
+            edges.reverse()
         else:
-            old_opt_path = vector.PathF([])
+            first_node = (first.nodes() - edges[1].nodes()).pop()
+            last_node = (last.nodes() - edges[-2].nodes()).pop()
+            start = min(first_node, last_node, key=lambda node: node.node_id)
+            if start == last_node:
+                edges.reverse()
 
-        # create the key under which we can find the data
-        key = self.create_key(edges)
+        d_edges = []
+        for edge in edges:
+            d_edges.append(graph.DirectionalGraphEdge(edge, edge.node_a == start))
+            start = d_edges[-1].end()
+        return d_edges
+
+    def most_frequent_keys(self, count=None):
+        """ lazy mode: the keys which were requested most often """
+        return [key for key, _ in self.query_counts.most_common(count)]
+
+    def warm_up(self, keys):
+        """ lazy mode: compute the entries of the keys (e.g. the most frequent keys of earlier searches) """
+        for key in keys:
+            if len(key) <= self.n:
+                self._request(key)
+
+    def _add_entry(self, key, edges):
+        """ compute the optimal path and the min/max length of the edges and save them """
+        # find optimal path by extending the old optimal path along the new edge
+        if len(edges) > 1:
+            prefix_key = self.create_key(edges[:-1])
+            if self.lazy:
+                # this is not counted as query
+                self._request(prefix_key)
+            opt_path = self.area_map.extend_optimised_path(self._oriented_opt_path(prefix_key, edges[:-1]),
+                                                           edges[-1].opt_path())
+            opt_path = vector.CompactPathF(opt_path.points)
+        else:
+            # the optimal path of the edge is immutable, hence it can be shared
+            opt_path = edges[-1].opt_path()
+        # find optimal gate path
+        opt_gate_path = self._opt_gate_path(
+            edges[0].start().position,
+            edges[0].start_gates(),
+            edges[-1].end().position,
+            edges[-1].end_gates(),
+            opt_path)
+        # save the optimal path and min/max
+        self._map_opt_path[key] = opt_path
+        self._map_length[key] = (opt_gate_path.length(), opt_path.length())
 
-        # if this key was already visited, do not skip it, just don't compute anything
-        if key not in self._map_opt_path:
-            # create an extended path along the new node
-            not_opt_path = old_opt_path.points + edges[-1].opt_path().points
-            not_opt_path = vector.PathF(not_opt_path)
-            # find optimal path
-            if len(edges) > 1:
-                opt_path = self.area_map.optimise_path(not_opt_path)
-            else:
-                opt_path = not_opt_path
-            # find optimal gate path
-            opt_gate_path = self._opt_gate_path(
-                edges[0].start().position,
-                edges[0].start_gates(),
-                edges[-1].end().position,
-                edges[-1].end_gates(),
-                opt_path)
-            # save the optimal path and min/max
-            self._map_opt_path[key] = opt_path
-            self._map_length[key] = (opt_gate_path.length(), opt_path.length())
-
-        # iterate over all edges
-        for edge in edges[-1].end().directional_edges():
-            # do not allow loops
-            if edge.end() == edges[0].start() or edge.end() in [e.end() for e in edges]:
-                continue
+    def _build(self):
+        self._add_missing_entries(self._first_walks())
+        print("added %d keys" % len(self._map_opt_path))
 
-            # now we have an edge with which we can extend our list
-            new_edges = edges + [edge]
+    def set_n(self, n):
+        """
+            change the maximal number of hops in place: if n is increased,
+            only the new keys are computed, if it is decreased, the keys with
+            more edges are dropped. the result is the same as a new build.
+        """
+        self.n = n
+        if self.lazy:
+            # the entries are computed on request
+            for key in [key for key in self._map_opt_path if len(key) > n]:
+                del self._map_opt_path[key]
+                del self._map_length[key]
+            return
 
-            # add it
-            self._build_helper(new_edges)
+        walks = self._first_walks()
+        self._add_missing_entries(walks)
+
+        # keep only the keys of the walks (in the order of the build)
+        self._map_opt_path = {key: self._map_opt_path[key] for key in walks}
+        self._map_length = {key: self._map_length[key] for key in walks}
+        print("%d keys for n=%d" % (len(self._map_opt_path), n))
+
+    def _first_walks(self):
+        """
+            find all keys (up to n edges, without loops) in the order of the build
+            and the edges from which they are computed (the first visit)
+        """
+        walks = {}
+
+        def visit(edges):
+            # if the nodes list is already too long, ignore it
+            if len(edges) > self.n:
+                return
+
+            # create the key under which we can find the data
+            key = self.create_key(edges)
+            # if this key was already visited, do not skip it, just don't save the edges
+            if key not in walks:
+                walks[key] = edges
+
+            # iterate over all edges
+            for edge in edges[-1].end().directional_edges():
+                # do not allow loops
+                if edge.end() == edges[0].start() or edge.end() in [e.end() for e in edges]:
+                    continue
+
+                # now we have an edge with which we can extend our list
+                visit(edges + [edge])
 
-    def _build(self):
         for node in self.graph.nodes:
             for edge in node.directional_edges():
-                self._build_helper([edge])
-        print("added %d keys" % len(self._map_opt_path))
+                visit([edge])
+        return walks
+
+    def _add_missing_entries(self, walks):
+        """
+            compute the entries of the walks (see _first_walks) which are missing,
+            the entry of a key is computed from the entry of its first n-1 edges
+        """
+        if pf_parallel.worker_count(self.workers) > 1:
+            self._add_missing_entries_parallel(walks)
+        else:
+            for key, edges in walks.items():
+                if key not in self._map_opt_path:
+                    self._add_entry(key, edges)
+
+    def _add_missing_entries_parallel(self, walks):
+        """
+            compute the missing entries with worker processes. the missing keys form
+            trees (rooted at keys whose first n-1 edges are known) which are independent.
+            the trees are distributed among the workers, the result is the same as
+            the one of the serial computation.
+        """
+        # group the missing keys by the root of their tree (in the order of the build)
+        roots = {}
+        trees = {}
+        for key, edges in walks.items():
+            if key in self._map_opt_path:
+                continue
+            parent_key = self.create_key(edges[:-1]) if len(edges) > 1 else None
+            root = roots.get(parent_key, key)
+            roots[key] = root
+            trees.setdefault(root, []).append((key, edges))
+        if not trees:
+            return
+
+        # the virtual gates which _opt_gate_path adds to the graph
+        # (the workers only change their copy of the graph)
+        for node in self.graph.nodes:
+            for edge in node.directional_edges():
+                self._opt_gate_path_prepare(edge.start().position, edge.start_gates())
+                self._opt_gate_path_prepare(edge.end().position, edge.end_gates())
+
+        # distribute the trees among the workers
+        workers = pf_parallel.worker_count(self.workers)
+        self.area_map.create_indices()
+        chunks = pf_parallel.split_into_chunks(list(trees.values()), 4 * workers)
+        chunks = [[entry for tree in chunk for entry in tree] for chunk in chunks]
+        results = pf_parallel.map_chunks(_build_entries, self, chunks, workers)
+
+        # merge the results (in the order of the build) and the statistics of the workers
+        entries = {}
+        for result, loose_ends_iterations in results:
+            entries.update((key, (opt_path, length)) for key, opt_path, length in result)
+            self.area_map.loose_ends_iterations.update(loose_ends_iterations)
+        for key in walks:
+            if key in entries:
+                self._map_opt_path[key], self._map_length[key] = entries[key]
 
     def _opt_gate_path(self, node_a_pos, node_a_gates, node_b_pos, node_b_gates, path):
         """
@@ -217,10 +420,8 @@ class NHopDictionary:
 		"""
 
         # if node a or b does not have a gate, add a virtual gate
-        if not node_a_gates:
-            node_a_gates.append(node_a_pos)
-        if not node_b_gates:
-            node_b_gates.append(node_b_pos)
+        self._opt_gate_path_prepare(node_a_pos, node_a_gates)
+        self._opt_gate_path_prepare(node_b_pos, node_b_gates)
 
         # iterate over all possible gates
         gate_paths = []
@@ -238,3 +439,29 @@ class NHopDictionary:
 
         # take the smallest one
         return min(gate_paths, key=lambda p: p.length())
+
+    @staticmethod
+    def _opt_gate_path_prepare(node_pos, node_gates):
+        """ if the node does not have a gate, add a virtual gate """
+        if not node_gates:
+            node_gates.append(node_pos)
+
+
+def _build_entries(n_hop_dict, entries):
+    """
+        compute the entries (key, edges) of the dictionary (in the worker),
+        every key comes after the key of its first n-1 edges. returns the
+        entries and the loose_ends_iterations of the area map for these entries.
+    """
+    # count the iterations of this chunk separately
+    area_map = n_hop_dict.area_map
+    loose_ends_iterations = area_map.loose_ends_iterations
+    area_map.loose_ends_iterations = collections.Counter()
+    try:
+        result = []
+        for key, edges in entries:
+            n_hop_dict._add_entry(key, edges)
+            result.append((key, n_hop_dict._map_opt_path[key], n_hop_dict._map_length[key]))
+        return result, area_map.loose_ends_iterations
+    finally:
+        area_map.loose_ends_iterations = loose_ends_iterations
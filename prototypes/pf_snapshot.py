@@ -0,0 +1,88 @@
+"""
+    Persistent snapshots of the preprocessed path finding data.
+
+    A snapshot file consists of a fixed size header followed by the pickled data:
+        - magic bytes (SNAPSHOT_MAGIC)
+        - format version (unsigned 32-bit, big endian)
+        - cache key (SHA-256 digest, see snapshot_key)
+        - length of the payload (unsigned 64-bit, big endian)
+        - payload (pickle)
+    Snapshots with a different version or key are considered stale.
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+
+SNAPSHOT_MAGIC = b"PFSNAPSHOT"
+# increment the version whenever the format or the preprocessing changes
+SNAPSHOT_VERSION = 11
+
+_header = struct.Struct(">%dsI32sQ" % len(SNAPSHOT_MAGIC))
+
+
+def snapshot_key(raw_map, pass_table, precomputed_hops):
+    """ compute the cache key: a hash of the map content, the pass test table and precomputed_hops """
+    h = hashlib.sha256()
+    h.update(struct.pack(">QQQQ", raw_map.width, raw_map.height, raw_map.max_value, precomputed_hops))
+    h.update(struct.pack(">Q", len(pass_table)))
+    h.update(pass_table)
+    h.update(raw_map.content_buffer())
+    return h.digest()
+
+
+def snapshot_path(directory, key):
+    """ the path of the snapshot file with the given key """
+    return os.path.join(directory, "%s.pfsnapshot" % key.hex())
+
+
+def save_snapshot(path, key, data):
+    """ save the data (atomically) in the snapshot file, the directory is created if necessary """
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    header = _header.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, key, len(payload))
+
+    # write into a temporary file and move it to the final destination
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_snapshot(path, key):
+    """
+        load the data of the snapshot file (which is memory mapped),
+        returns None if the file does not exist, is stale or damaged
+    """
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # the file does not exist or is empty
+        return None
+
+    try:
+        if len(buffer) < _header.size:
+            return None
+
+        magic, version, snapshot_key, length = _header.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or snapshot_key != key:
+            return None
+        if len(buffer) != _header.size + length:
+            return None
+
+        with memoryview(buffer)[_header.size:] as payload:
+            try:
+                return pickle.loads(payload)
+            except Exception:
+                return None
+    finally:
+        buffer.close()
@@ -4,11 +4,22 @@ import sys
 if sys.version_info < (3, 2, 0):
     raise RuntimeError("Python version >= 3.2 is needed.")
 
+import collections
+import heapq
+import os
+import random
+import shutil
+import struct
+import tempfile
 import unittest
 
 from geometry import vector
-from map import map_base
+from map import map_base, raw_map, area_map, influence_map
 from graph import shortest_path
+import pf_data
+import pf_parallel
+import pf_shortest_path
+import pf_snapshot
 
 
 # available methods:
@@ -29,6 +40,39 @@ class TestBaseMap(unittest.TestCase):
         """ test if everything works as expected """
         base_map = map_base.MapBase(10, 10, [])
 
+    def helper_test_bulk_accessors(self, data):
+        """ helper method: test the bulk accessors for the given storage """
+        base_map = map_base.MapBase(4, 3, data)
+
+        base_map.set_row(1, 1, [5, 6])
+        self.assertEqual(list(base_map.get_row(1)), [0, 5, 6, 0])
+        self.assertEqual(list(base_map.get_row(1, 2, 4)), [6, 0])
+
+        base_map.fill_row(2, 0, 3, 7)
+        self.assertEqual(list(base_map.get_row(2)), [7, 7, 7, 0])
+
+        base_map.set_values([0, 3], [0, 2], [8, 9])
+        base_map.set_values([1], [0], 4)
+        self.assertEqual(list(base_map.get_values([0, 1, 3, 1], [0, 0, 2, 1])), [8, 4, 9, 5])
+        self.assertEqual(base_map[vector.GridTile(3, 2)], 9)
+
+        base_map.assign_where([v == 7 for v in base_map.data], -1)
+        self.assertEqual(list(base_map.get_row(2)), [-1, -1, -1, 9])
+
+        # the copy is independent of the original
+        copied_map = map_base.MapBase(4, 3, base_map.copy_data())
+        copied_map[vector.GridTile(0, 0)] = 1
+        self.assertEqual(base_map[vector.GridTile(0, 0)], 8)
+
+    def test_bulk_accessors(self):
+        """ test the bulk accessors in the list mode """
+        self.helper_test_bulk_accessors(12 * [0])
+
+    @unittest.skipIf(map_base.numpy is None, "NumPy is not available")
+    def test_bulk_accessors_array_backed(self):
+        """ test the bulk accessors in the array-backed mode """
+        self.helper_test_bulk_accessors(map_base.numpy.zeros((3, 4), dtype=map_base.numpy.int32))
+
     def test_find_gridpoints_in_triangle_iterator(self):
         """ test find_gridpoints_in_triangle_iterator """
 
@@ -174,6 +218,27 @@ class TestBaseMap(unittest.TestCase):
         expected = [GridTile(1, 1), GridTile(2, 1)]
         self.assertEqual(result, expected)
 
+    def test_find_spans_in_triangle_iterator(self):
+        """ test find_tile_spans_in_triangle_iterator and find_gridpoint_spans_in_triangle_iterator """
+        base_map = map_base.MapBase(10, 8, [])
+
+        # the triangles partially lie outside of the map
+        rng = random.Random(0)
+        for _ in range(200):
+            a, b, c = [vector.PointF(rng.uniform(-3, 13), rng.choice([rng.randint(-3, 11), rng.uniform(-3, 11)]))
+                       for _ in range(3)]
+
+            spans = list(base_map.find_tile_spans_in_triangle_iterator(a, b, c))
+            for y, x_start, x_end in spans:
+                self.assertTrue(0 <= y < base_map.height and 0 <= x_start < x_end <= base_map.width)
+            tiles = [vector.GridTile(x, y) for y, x_start, x_end in spans for x in range(x_start, x_end)]
+            self.assertEqual(tiles, list(base_map.find_tiles_in_triangle_iterator(a, b, c)))
+
+            spans = list(base_map.find_gridpoint_spans_in_triangle_iterator(a, b, c))
+            points = [vector.GridPoint(x, y) for y, x_start, x_end in spans for x in range(x_start, x_end)]
+            expected = [p for p in base_map.find_gridpoints_in_triangle_iterator(a, b, c) if base_map.contains(p)]
+            self.assertEqual(points, expected)
+
 
 class TestRawMap(unittest.TestCase):
     """
@@ -183,7 +248,79 @@ class TestRawMap(unittest.TestCase):
 
     def test_create(self):
         """ test if everything works as expected """
-        raw_map = raw_map.RawMap.read(self.raw_map_path)
+        rmap = raw_map.RawMap.read(self.raw_map_path)
+
+    def write_temporary_map(self, content):
+        """ helper method which writes content into a temporary file """
+        f = tempfile.NamedTemporaryFile(suffix=".pgm", delete=False)
+        f.write(content)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_read_8_bit(self):
+        """ test reading an 8-bit binary map """
+        rmap = raw_map.RawMap.read(self.raw_map_path)
+        self.assertEqual((rmap.width, rmap.height, rmap.max_value), (26, 12, 255))
+        self.assertEqual(len(rmap.data), 26 * 12)
+        # the data is a (read-only) view of the file, not a copy
+        self.assertIsInstance(rmap.data, memoryview)
+        self.assertTrue(rmap.data.readonly)
+        self.assertEqual(rmap[vector.GridTile(0, 0)], 255)
+
+    def test_read_16_bit(self):
+        """ test reading a 16-bit binary map """
+        path = self.write_temporary_map(b"P5\n# comment\n3 2\n1000\n" +
+                                        bytes([0, 1, 1, 0, 3, 232, 0, 0, 255, 255, 2, 1]))
+        rmap = raw_map.RawMap.read(path)
+        self.assertEqual((rmap.width, rmap.height, rmap.max_value), (3, 2, 1000))
+        self.assertEqual(list(rmap.data), [1, 256, 1000, 0, 65535, 513])
+        self.assertEqual(rmap[vector.GridTile(2, 1)], 513)
+
+    def test_read_ascii(self):
+        """ test reading an ASCII map """
+        path = self.write_temporary_map(b"P2 3 2 # comment\n 255\n0 17 255\n 3\n\n42 9")
+        rmap = raw_map.RawMap.read(path)
+        self.assertEqual((rmap.width, rmap.height, rmap.max_value), (3, 2, 255))
+        self.assertEqual(list(rmap.data), [0, 17, 255, 3, 42, 9])
+        self.assertEqual(rmap[vector.GridTile(1, 0)], 17)
+
+    def test_passability_mask(self):
+        """ test the pass test lookup table and the passability mask """
+        path = self.write_temporary_map(b"P5 3 2 300\n" + bytes([0, 0, 1, 44, 0, 255, 0, 1, 0, 45, 1, 0]))
+        rmap = raw_map.RawMap.read(path)
+        pass_table = rmap.compile_pass_test(lambda x: x > 255)
+        self.assertEqual(len(pass_table), 301)
+        self.assertEqual(rmap.passability_mask(pass_table), bytes([0, 1, 0, 0, 0, 1]))
+
+        rmap = raw_map.RawMap.read(self.raw_map_path)
+        pass_table = rmap.compile_pass_test(lambda x: x == 255)
+        self.assertEqual(len(pass_table), 256)
+        self.assertEqual(rmap.passability_mask(pass_table), bytes(v == 255 for v in rmap.data))
+
+        rmap = raw_map.RawMap(3, 1, [7, 0, 3], max_value=7)
+        self.assertEqual(rmap.passability_mask(rmap.compile_pass_test(lambda x: x < 5)), bytes([0, 1, 1]))
+
+        # values above max_value are covered, negative values are rejected
+        rmap = raw_map.RawMap(3, 3, [0, 300, 0, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(len(rmap.compile_pass_test(lambda x: x == 0)), 301)
+        amap = area_map.AreaMap(rmap, lambda x: x == 0)
+        self.assertEqual(amap[vector.GridTile(1, 0)], amap.no_area_id + 1)
+        self.assertRaises(ValueError, raw_map.RawMap(2, 1, [0, -1]).compile_pass_test, lambda x: x == 0)
+
+        # samples above the maxval of the header
+        path = self.write_temporary_map(b"P2 3 1 100\n0 200 300")
+        rmap = raw_map.RawMap.read(path)
+        self.assertEqual(list(rmap.data), [0, 200, 300])
+        self.assertEqual(rmap.value_range(), (0, 300))
+        self.assertEqual(rmap.passability_mask(rmap.compile_pass_test(lambda x: x > 250)), bytes([0, 0, 1]))
+
+    @unittest.skipIf(raw_map.numpy is None, "NumPy is not available")
+    def test_numpy_view(self):
+        """ test the NumPy view of the map """
+        rmap = raw_map.RawMap.read(self.raw_map_path)
+        self.assertEqual(rmap.array.shape, (12, 26))
+        self.assertEqual(rmap.array[3, 5], rmap[vector.GridTile(5, 3)])
 
 
 class TestAreaMap(unittest.TestCase):
@@ -193,13 +330,83 @@ class TestAreaMap(unittest.TestCase):
 
     def test_create(self):
         """ test if everything works as expected """
-        raw_map = raw_map.RawMap(10, 10, 100 * [0])
-        area_map = area_map.AreaMap(raw_map, lambda _: True)
+        rmap = raw_map.RawMap(10, 10, 100 * [0])
+        amap = area_map.AreaMap(rmap, lambda _: True)
+
+    def assertAreaMapsEqual(self, amap, expected):
+        """ helper method: compare the areas, representatives and edges (in the same order) """
+        self.assertEqual(list(amap.data), list(expected.data))
+        self.assertEqual(amap.representatives, expected.representatives)
+        self.assertEqual(list(amap.edges), list(expected.edges))
+        for area_id, edges in expected.edges.items():
+            self.assertEqual([(e.a, e.b) for e in amap.edges[area_id]],
+                             [(e.a, e.b) for e in edges])
+
+    def test_labelling(self):
+        """ test if the labelling gives the same result as the flood fill """
+        pass_test = lambda x: x == 255
+
+        for path in ["example0.pgm", "example1.pgm", "example2.pgm", "example3.pgm"]:
+            rmap = raw_map.RawMap.read(path)
+            self.assertAreaMapsEqual(area_map.AreaMap(rmap, pass_test),
+                                     area_map.AreaMap(rmap, pass_test, flood_fill=True))
+
+        # hence the boundaries are the same
+        rmap = raw_map.RawMap.read("example1.pgm")
+        imap = influence_map.InfluenceMap(area_map.AreaMap(rmap, pass_test))
+        imap_reference = influence_map.InfluenceMap(area_map.AreaMap(rmap, pass_test, flood_fill=True))
+        self.assertEqual(str(imap.boundaries), str(imap_reference.boundaries))
+        self.assertEqual(imap.data, imap_reference.data)
+
+        # random maps
+        rng = random.Random(0)
+        for width, height, density in [(1, 1, 1.), (1, 7, .5), (9, 1, .5), (2, 2, .5),
+                                       (13, 11, .2), (17, 19, .45), (30, 20, .6)]:
+            for _ in range(5):
+                data = [0 if rng.random() < density else 255 for _ in range(width * height)]
+                rmap = raw_map.RawMap(width, height, data)
+                self.assertAreaMapsEqual(area_map.AreaMap(rmap, pass_test),
+                                         area_map.AreaMap(rmap, pass_test, flood_fill=True))
+
+    @unittest.skipIf(map_base.numpy is None, "NumPy is not available")
+    def test_array_backed(self):
+        """ test if the array-backed mode gives the same result as the list mode """
+        rmap = raw_map.RawMap.read("example1.pgm")
+        amap = area_map.AreaMap(rmap, lambda x: x == 255)
+        amap_array = area_map.AreaMap(rmap, lambda x: x == 255, array_backed=True)
+
+        self.assertTrue(amap_array.is_array_backed())
+        self.assertEqual(amap_array.array.dtype, map_base.numpy.int32)
+        self.assertAreaMapsEqual(amap_array, amap)
+
+        imap = influence_map.InfluenceMap(amap)
+        imap_array = influence_map.InfluenceMap(amap_array)
+        self.assertTrue(imap_array.is_array_backed())
+        self.assertEqual(list(imap_array.data), imap.data)
+
+    def test_get_point_area_ids(self):
+        """ test if get_point_area_ids agrees with get_point_area_id """
+        rmap = raw_map.RawMap.read("example1.pgm")
+        amaps = [area_map.AreaMap(rmap, lambda x: x == 255)]
+        if map_base.numpy is not None:
+            amaps.append(area_map.AreaMap(rmap, lambda x: x == 255, array_backed=True))
+        for amap in amaps:
+            ids = amap.get_point_area_ids()
+            self.assertEqual(len(ids), (amap.width + 1) * (amap.height + 1))
+            for y in range(amap.height + 1):
+                for x in range(amap.width + 1):
+                    self.assertEqual(ids[x + y * (amap.width + 1)], amap.get_point_area_id(vector.GridPoint(x, y)))
+
+        # the ids are recomputed when the data changes
+        amap = amaps[0]
+        tile = vector.GridTile(amap.width - 1, amap.height - 1)
+        amap[tile] = 17
+        self.assertEqual(amap.get_point_area_ids()[(amap.width + 1) * amap.height - 2], 17)
 
     def test_find_obstruction_when_transforming_line(self):
         """ test find_obstruction_when_transforming_line """
-        raw_map = raw_map.RawMap(10, 10, 100 * [0])
-        area_map = area_map.AreaMap(raw_map, lambda _: True)
+        rmap = raw_map.RawMap(10, 10, 100 * [0])
+        amap = area_map.AreaMap(rmap, lambda _: True)
 
         base = vector.PointF(2, 2)
         start = vector.PointF(8, 2)
@@ -207,50 +414,176 @@ class TestAreaMap(unittest.TestCase):
 
         # print(area_map.find_tiles_in_triangle(base, start, end))
 
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (1.0, None))
 
-        area_map[vector.GridTile(4, 4)] = 0  # 4,4 is now unpassable
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        amap[vector.GridTile(4, 4)] = 0  # 4,4 is now unpassable
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (0.4, vector.GridPoint(5, 4)))
 
-        area_map[vector.GridTile(6, 3)] = 0  # 6,3 is now unpassable
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        amap[vector.GridTile(6, 3)] = 0  # 6,3 is now unpassable
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (1. / 6., vector.GridTile(7, 3)))
 
-        area_map[vector.GridTile(4, 2)] = 0  # 4,2 is now unpassable
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        amap[vector.GridTile(4, 2)] = 0  # 4,2 is now unpassable
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (0., vector.GridPoint(5, 2)))
 
-        area_map[vector.GridTile(2, 2)] = 0  # 2,2 is now unpassable
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        amap[vector.GridTile(2, 2)] = 0  # 2,2 is now unpassable
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (0., vector.GridPoint(5, 2)))
 
         # test angle > 90
         base = vector.PointF(6, 4)
         start = vector.PointF(9, 5)
         end = vector.PointF(3, 5)
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (2. / 3., vector.GridPoint(5, 5)))
 
         base = vector.PointF(3, 3)
         start = vector.PointF(0, 5)
         end = vector.PointF(9, 7)
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (0.5, vector.GridPoint(4, 5)))
 
-        area_map[vector.GridTile(6, 5)] = 0  # 6,5 is now unpassable
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        amap[vector.GridTile(6, 5)] = 0  # 6,5 is now unpassable
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (0.5, vector.GridPoint(4, 5)))
 
-        area_map[vector.GridTile(4, 4)] = -1  # 4,4 is now passable again
-        self.assertEqual(area_map.find_obstruction_when_transforming_line(base, start, end),
+        amap[vector.GridTile(4, 4)] = -1  # 4,4 is now passable again
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
                          (5. / 7., vector.GridPoint(6, 6)))
 
+    def helper_test_count_blocked_tiles(self, array_backed):
+        """ helper method: compare count_blocked_tiles with counting tile by tile """
+        rmap = raw_map.RawMap.read("example0.pgm")
+        amap = area_map.AreaMap(rmap, lambda x: x == 255, array_backed=array_backed)
+
+        def count(x_start, y_start, x_end, y_end):
+            return sum(amap[vector.GridTile(x, y)] != amap.no_area_id
+                       for x in range(max(x_start, 0), min(x_end, amap.width))
+                       for y in range(max(y_start, 0), min(y_end, amap.height)))
+
+        rng = random.Random(0)
+        for i in range(200):
+            # change the data from time to time
+            if i % 50 == 49:
+                amap[vector.GridTile(rng.randrange(amap.width), rng.randrange(amap.height))] = amap.no_area_id
+            x_start, x_end = sorted(rng.randint(-2, amap.width + 2) for _ in range(2))
+            y_start, y_end = sorted(rng.randint(-2, amap.height + 2) for _ in range(2))
+            self.assertEqual(amap.count_blocked_tiles(x_start, y_start, x_end, y_end),
+                             count(x_start, y_start, x_end, y_end))
+
+        # the indices are not pickled
+        state = amap.__getstate__()
+        self.assertIsNone(state['_obstacle_index'])
+        self.assertIsNone(state['_blocked_table'])
+
+    def test_count_blocked_tiles(self):
+        """ test count_blocked_tiles in the list mode """
+        self.helper_test_count_blocked_tiles(False)
+
+    @unittest.skipIf(map_base.numpy is None, "NumPy is not available")
+    def test_count_blocked_tiles_array_backed(self):
+        """ test count_blocked_tiles in the array-backed mode """
+        self.helper_test_count_blocked_tiles(True)
+
+    def test_find_obstruction_when_transforming_line_early_exit(self):
+        """ test that triangles without unpassable tiles in their bounding box are not scanned """
+        rmap = raw_map.RawMap(10, 10, 100 * [255])
+        rmap[vector.GridTile(7, 7)] = 0
+        amap = area_map.AreaMap(rmap, lambda x: x == 255)
+        base, start, end = vector.PointF(1, 1), vector.PointF(6, 1), vector.PointF(6, 6)
+
+        # the early exit does not need the obstacle index
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end), (1., None))
+        self.assertIsNone(amap._obstacle_index)
+
+        # the bounding box touches the unpassable tile
+        end = vector.PointF(7.5, 7.5)
+        self.assertEqual(amap.find_obstruction_when_transforming_line(base, start, end),
+                         amap.find_obstruction_when_transforming_line_slow(base, start, end))
+        self.assertIsNotNone(amap._obstacle_index)
+
+    def test_find_obstruction_when_transforming_line_index(self):
+        """ test if the obstacle index gives the same results as the tile by tile scan """
+        rmap = raw_map.RawMap.read("example0.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255)
+        amap = data.area_map
+
+        # record the queries of the path finding
+        queries = []
+        find_obstruction = amap.find_obstruction_when_transforming_line
+
+        def recording_find_obstruction(base, start, end):
+            queries.append((base, start, end))
+            return find_obstruction(base, start, end)
+
+        amap.find_obstruction_when_transforming_line = recording_find_obstruction
+        for start in data.graph.nodes:
+            for end in data.graph.nodes[::3]:
+                if start != end:
+                    data.shortest_path.find_path_between_nodes(start, end)
+
+        self.assertTrue(queries)
+        for base, start, end in queries:
+            self.assertEqual(find_obstruction(base, start, end),
+                             amap.find_obstruction_when_transforming_line_slow(base, start, end))
+
+    def test_deque_path(self):
+        """ test that DequePathF behaves like PathF """
+        points = [vector.PointF(0, 0), vector.PointF(3, 4), vector.PointF(3, 0), vector.PointF(1, 1)]
+        path, deque_path = vector.PathF(list(points)), vector.DequePathF(points)
+
+        self.assertEqual(deque_path, path)
+        self.assertEqual(deque_path.length(), path.length())
+        self.assertEqual(deque_path.reversed(), path.reversed())
+        self.assertEqual(deque_path.get_path_extended_by(points[0]), path.get_path_extended_by(points[0]))
+        self.assertEqual(vector.DequePathF().length(), vector.PathF().length())
+
+        self.assertEqual(deque_path.pop_first(), path.pop_first())
+        deque_path.prepend(points[2])
+        path.prepend(points[2])
+        deque_path.append(points[1])
+        path.append(points[1])
+        self.assertEqual((deque_path.start(), deque_path.end()), (path.start(), path.end()))
+        self.assertEqual(deque_path.toPathF().points, path.points)
+
+    def test_compact_path(self):
+        """ test that CompactPathF behaves like PathF """
+        points = [vector.PointF(0, 0), vector.PointF(3, 4), vector.PointF(3, 0), vector.PointF(1.5, 1)]
+        path, compact_path = vector.PathF(list(points)), vector.CompactPathF(points)
+
+        self.assertEqual(compact_path, path)
+        self.assertEqual(compact_path.length(), path.length())
+        self.assertEqual(compact_path.node_count(), path.node_count())
+        self.assertEqual((compact_path.start(), compact_path.end()), (path.start(), path.end()))
+        self.assertEqual(compact_path.points[1:3], path.points[1:3])
+        self.assertEqual(compact_path.points[:0:-1], path.points[:0:-1])
+        self.assertEqual(path.points[:1] + compact_path.points + path.points[:1], [points[0]] + points + [points[0]])
+        self.assertTrue(compact_path.has_point(points[3]))
+        self.assertEqual(compact_path.get_path_extended_by(points[0]), path.get_path_extended_by(points[0]))
+        self.assertEqual(compact_path.toPathF().points, path.points)
+        self.assertTrue(vector.CompactPathF().empty())
+
+        # the reversed path is a view on the same coordinates
+        reversed_path = compact_path.reversed()
+        self.assertIs(reversed_path._coordinates, compact_path._coordinates)
+        self.assertEqual(reversed_path, path.reversed())
+        self.assertEqual(list(reversed(reversed_path.points)), points)
+        self.assertEqual(reversed_path.points[-1], points[0])
+        self.assertEqual(reversed_path.reversed(), path)
+        self.assertEqual(reversed_path.length(), compact_path.length())
+
+        # it is immutable
+        self.assertRaises(TypeError, compact_path.append, points[0])
+        self.assertRaises(TypeError, compact_path.pop_first)
+        self.assertRaises(IndexError, lambda: compact_path.points[4])
+
     def test_optimise_point_to_line(self):
         """ test optimise_point_to_line """
-        raw_map = raw_map.RawMap(10, 10, 100 * [0])
-        area_map = area_map.AreaMap(raw_map, lambda _: True)
+        rmap = raw_map.RawMap(10, 10, 100 * [0])
+        amap = area_map.AreaMap(rmap, lambda _: True)
 
         p = vector.PointF(3, 4)
         a = vector.PointF(2, 0)
@@ -258,32 +591,32 @@ class TestAreaMap(unittest.TestCase):
         p0 = a
 
         # direct path p->(3,0) is valid and optimal
-        self.assertEqual(area_map.optimise_point_to_line(p, p0, a, b),
+        self.assertEqual(amap.optimise_point_to_line(p, p0, a, b),
                          vector.PathF([p, vector.PointF(3, 0)]))
 
         # direct path p->a is valid and optimal
         p = vector.PointF(1, 4)
-        self.assertEqual(area_map.optimise_point_to_line(p, p0, a, b),
+        self.assertEqual(amap.optimise_point_to_line(p, p0, a, b),
                          vector.PathF([p, a]))
 
         # direct path p->b is valid and optimal
         p = vector.PointF(5, 4)
-        self.assertEqual(area_map.optimise_point_to_line(p, p0, a, b),
+        self.assertEqual(amap.optimise_point_to_line(p, p0, a, b),
                          vector.PathF([p, b]))
 
         print("h")
         # direct path p->b is not valid anymore, but
         # p->(3,2)->(3,0) is valid and optimal.
         # also note that p->a is valid.
-        area_map[vector.GridTile(3, 1)] = 0  # 3,1 is now unpassable
+        amap[vector.GridTile(3, 1)] = 0  # 3,1 is now unpassable
         p = vector.PointF(4, 4)
-        self.assertEqual(area_map.optimise_point_to_line(p, p0, a, b),
+        self.assertEqual(amap.optimise_point_to_line(p, p0, a, b),
                          vector.PathF([p, vector.PointF(3, 2), vector.PointF(3, 0)]))
 
     def optimise_path_loose_ends(self):
         """ test optimise_path_loose_ends """
-        raw_map = raw_map.RawMap(10, 10, 100 * [0])
-        area_map = area_map.AreaMap(raw_map, lambda _: True)
+        rmap = raw_map.RawMap(10, 10, 100 * [0])
+        amap = area_map.AreaMap(rmap, lambda _: True)
 
         start_a = vector.PointF(2, 0)
         start_b = vector.PointF(4, 0)
@@ -292,17 +625,17 @@ class TestAreaMap(unittest.TestCase):
 
         # direct start_b->end_a is valid and optimal
         path = vector.PathF([start_a, end_b])
-        self.assertEqual(area_map.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
+        self.assertEqual(amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
                          vector.PathF([start_b, end_a]))
 
-        area_map[vector.GridTile(3, 1)] = 0  # 3,1 is now unpassable
+        amap[vector.GridTile(3, 1)] = 0  # 3,1 is now unpassable
         # direct start_b->end_a is not valid anymore. however
         # (3,0)->(3,2)->end_a is. note that start_a->end_a is valid
         path = vector.PathF([start_a, end_a])
-        self.assertEqual(area_map.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
+        self.assertEqual(amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
                          vector.PathF([vector.PointF(3, 0), vector.PointF(3, 2), end_a]))
 
-        area_map[vector.GridTile(3, 1)] = -1  # 3,1 is now passable again
+        amap[vector.GridTile(3, 1)] = -1  # 3,1 is now passable again
 
         # small number
         eps = 0.001
@@ -315,10 +648,10 @@ class TestAreaMap(unittest.TestCase):
 
         # direct start_b->end_b is valid and optimal
         path = vector.PathF([start_a, end_a])
-        self.assertEqual(area_map.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
+        self.assertEqual(amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
                          vector.PathF([start_b, end_b]))
 
-        area_map[vector.GridTile(2, 1)] = 0  # 2,1 is now unpassable
+        amap[vector.GridTile(2, 1)] = 0  # 2,1 is now unpassable
         # prevented convergence catastrophe (fixed by preprocess step)
         start_a = vector.PointF(0, 0)
         start_b = vector.PointF(10, 1.5)
@@ -327,7 +660,7 @@ class TestAreaMap(unittest.TestCase):
 
         # optimal is ???->(3,1)->(3,2)->???
         path = vector.PathF([start_a, end_a])
-        self.assertEqual(area_map.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
+        self.assertEqual(amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
                          vector.PathF([
                              vector.PointF(860 / 409., 129 / 409.),
                              vector.PointF(2, 1),
@@ -343,9 +676,50 @@ class TestAreaMap(unittest.TestCase):
 
         # degerenates to start_b=end_b
         path = vector.PathF([start_a, end_a])
-        self.assertEqual(area_map.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
+        self.assertEqual(amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
                          vector.PathF([start_b, end_b]))
 
+    def test_optimise_path_loose_ends_iterations(self):
+        """ test that straight solutions of optimise_path_loose_ends are found in one iteration """
+        rmap = raw_map.RawMap(10, 10, 100 * [0])
+        amap = area_map.AreaMap(rmap, lambda _: True)
+
+        # the slow convergence case of optimise_path_loose_ends
+        eps = 0.001
+        start_a = vector.PointF(2, 0)
+        start_b = vector.PointF(4, eps)
+        end_a = vector.PointF(2, 4)
+        end_b = vector.PointF(4, 4 - eps)
+
+        path = vector.PathF([start_a, end_a])
+        self.assertEqual(amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
+                         vector.PathF([start_b, end_b]))
+        self.assertEqual(amap.loose_ends_iterations, {1: 1})
+
+        # the closest points are not end points of both lines
+        start_a = vector.PointF(1, 1)
+        start_b = vector.PointF(5, 1)
+        end_a = vector.PointF(3, 3)
+        end_b = vector.PointF(7, 7)
+
+        path = vector.PathF([start_a, end_b])
+        self.assertEqual(amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b),
+                         vector.PathF([vector.PointF(3, 1), end_a]))
+        self.assertEqual(amap.loose_ends_iterations, {1: 2})
+
+        # the lines cross, the crossing point is the solution
+        start_a = vector.PointF(18, 12)
+        start_b = vector.PointF(24, 6)
+        end_a = vector.PointF(19, 12)
+        end_b = vector.PointF(19, 0)
+        rmap = raw_map.RawMap(30, 20, 600 * [0])
+        amap = area_map.AreaMap(rmap, lambda _: True)
+
+        path = vector.PathF([start_a, end_a])
+        result = amap.optimise_path_loose_ends(path, start_a, start_b, end_a, end_b)
+        self.assertEqual(result.length(), 0.)
+        self.assertEqual(result.start(), vector.PointF(19, 11))
+
 
 class TestInfluenceMap(unittest.TestCase):
     """
@@ -354,9 +728,387 @@ class TestInfluenceMap(unittest.TestCase):
 
     def test_create(self):
         """ test if everything works as expected """
-        raw_map = raw_map.RawMap(10, 10, 100 * [0])
-        area_map = area_map.AreaMap(raw_map, lambda _: True)
-        influence_map = influence_map.InfluenceMap(area_map)
+        rmap = raw_map.RawMap(10, 10, 100 * [0])
+        amap = area_map.AreaMap(rmap, lambda _: True)
+        imap = influence_map.InfluenceMap(amap)
+
+    def test_full_sweeps(self):
+        """ test if the ballooning gives the same result as the full sweeps """
+        pass_test = lambda x: x == 255
+
+        amaps = [area_map.AreaMap(raw_map.RawMap.read(path), pass_test)
+                 for path in ["example0.pgm", "example1.pgm", "example3.pgm"]]
+
+        # random maps
+        rng = random.Random(0)
+        for width, height, density in [(1, 1, 1.), (9, 1, .5), (13, 11, .2), (17, 19, .45), (30, 20, .6)]:
+            for _ in range(5):
+                data = [0 if rng.random() < density else 255 for _ in range(width * height)]
+                amaps.append(area_map.AreaMap(raw_map.RawMap(width, height, data), pass_test))
+
+        for amap in amaps:
+            imap = influence_map.InfluenceMap(amap)
+            imap_reference = influence_map.InfluenceMap(amap, full_sweeps=True)
+            self.assertEqual(str(imap.boundaries), str(imap_reference.boundaries))
+            self.assertEqual(imap.data, imap_reference.data)
+
+    def test_decompose_edges_into_loops(self):
+        """ test decompose_edges_into_loops """
+        # two squares touching at the point (1,1)
+        points = [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2), (1, 2), (1, 1), (0, 1), (0, 0)]
+        points = [vector.GridPoint(x, y) for x, y in points]
+        edges = [vector.GridEdge(a, b) for a, b in zip(points[:-1], points[1:])]
+
+        loops = influence_map.InfluenceMap.decompose_edges_into_loops(list(reversed(edges)))
+        # the loops turn left at (1,1)
+        self.assertEqual(sorted(len(loop) for loop in loops), [4, 4])
+        self.assertEqual(sorted(id(edge) for loop in loops for edge in loop), sorted(id(edge) for edge in edges))
+        for loop in loops:
+            for e0, e1 in zip(loop, loop[1:] + loop[:1]):
+                self.assertEqual(e0.b, e1.a)
+
+        # the loops start with the last edge of the list
+        self.assertEqual([loop[0].a for loop in loops], [vector.GridPoint(0, 0), vector.GridPoint(1, 1)])
+
+    def test_cyclic_update_loop(self):
+        """ test if CyclicUpdateLoop behaves like an update of the array new + old """
+
+        class UpdateArray:
+            """ the reference: the elements before the current one are new, the others are old """
+
+            def __init__(self, array):
+                self.new, self.old = [], list(array)
+
+            def get(self, rel_pos):
+                array = self.new + self.old
+                return array[(len(self.new) + rel_pos) % len(array)]
+
+            def delete(self, rel_pos):
+                pos = (len(self.new) + rel_pos) % (len(self.new) + len(self.old))
+                if pos < len(self.new):
+                    del self.new[pos]
+                else:
+                    del self.old[pos - len(self.new)]
+
+        rng = random.Random(0)
+        for _ in range(300):
+            array = list(range(rng.randint(1, 8)))
+            reference = UpdateArray(array)
+            # the full sweep and the update which only visits the replaced elements
+            sweep_loop = influence_map.CyclicUpdateLoop(array)
+            seek_loop = influence_map.CyclicUpdateLoop(array)
+            self.assertEqual(sweep_loop.get_array(), array)
+            sweep_loop.begin_update()
+            node_of = {node.element: node for node in seek_loop.begin_update()}
+
+            # replace elements randomly (as in an expansion) or confirm them
+            element = len(array)
+            while reference.old:
+                self.assertFalse(sweep_loop.is_finished())
+                if rng.random() < .5:
+                    reference.new.append(reference.old.pop(0))
+                    sweep_loop.confirm()
+                    continue
+
+                self.assertTrue(seek_loop.seek(node_of[reference.get(0)]))
+                for rel_pos in range(-2, 3):
+                    self.assertEqual(sweep_loop.get(rel_pos), reference.get(rel_pos))
+                    self.assertEqual(seek_loop.get(rel_pos), reference.get(rel_pos))
+
+                operations = ['delete -1'] * rng.randint(0, 2) + ['insert'] * rng.randint(0, 2)
+                operations += ['delete 0'] + ['insert'] * rng.randint(0, 2) + ['delete 0'] * rng.randint(0, 1)
+                for operation in operations:
+                    length = len(reference.new) + len(reference.old)
+                    if operation == 'insert':
+                        element += 1
+                        reference.new.append(element)
+                        sweep_loop.insert(element)
+                        seek_loop.insert(element)
+                    elif length > 1 or (length == 1 and operation == 'delete 0'):
+                        rel_pos = int(operation.split()[1])
+                        reference.delete(rel_pos)
+                        sweep_loop.delete(rel_pos)
+                        seek_loop.delete(rel_pos)
+                    self.assertEqual(sweep_loop.length(), len(reference.new) + len(reference.old))
+                    self.assertEqual(seek_loop.length(), len(reference.new) + len(reference.old))
+
+            self.assertTrue(sweep_loop.is_finished())
+            self.assertEqual(sweep_loop.get_array(), reference.new)
+            self.assertEqual(seek_loop.get_array(), reference.new)
+            self.assertEqual(seek_loop.has_pending(), element > len(array))
+
+
+class TestPathFindingData(unittest.TestCase):
+    """
+		test pf_data
+	"""
+
+    def test_snapshot(self):
+        """ test if the preprocessed data is saved and restored """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        rmap = raw_map.RawMap.read("example0.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=cache_dir)
+        self.assertFalse(data.loaded_from_snapshot)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        # the second time, the snapshot is used
+        restored = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=cache_dir)
+        self.assertTrue(restored.loaded_from_snapshot)
+        self.assertIs(restored.area_map.raw_map, rmap)
+        self.assertEqual(restored.area_map.data, data.area_map.data)
+        self.assertEqual(restored.influence_map.boundaries.keys(), data.influence_map.boundaries.keys())
+        self.assertEqual([node.position for node in restored.graph.nodes],
+                         [node.position for node in data.graph.nodes])
+        for node in restored.graph.nodes:
+            for edge in node.edges:
+                self.assertIn(node, edge.nodes())
+                self.assertTrue(any(edge is e for e in restored.graph.edges))
+                self.assertIs(restored.graph.edges[edge.edge_id], edge)
+        self.assertEqual(restored.shortest_path._n_hop_dict._map_length, data.shortest_path._n_hop_dict._map_length)
+
+        start, end = restored.graph.nodes[0], restored.graph.nodes[-1]
+        self.assertEqual(restored.shortest_path.find_path_between_nodes(start, end),
+                         data.shortest_path.find_path_between_nodes(data.graph.nodes[0], data.graph.nodes[-1]))
+
+        # a different pass test or number of hops does not use the snapshot
+        other = pf_data.PathFindingData(rmap, lambda x: x != 0, cache_dir=cache_dir)
+        self.assertFalse(other.loaded_from_snapshot)
+        other = pf_data.PathFindingData(rmap, lambda x: x == 255, precomputed_hops=2, cache_dir=cache_dir)
+        self.assertFalse(other.loaded_from_snapshot)
+        self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+        # the lazy mode reuses the snapshot, but not its dictionary
+        lazy = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=cache_dir, lazy_hops=True, hop_cache_size=4)
+        self.assertTrue(lazy.loaded_from_snapshot)
+        self.assertTrue(lazy.shortest_path._n_hop_dict.lazy)
+        self.assertEqual(lazy.shortest_path._n_hop_dict.cache_size, 4)
+
+    def test_graph_ids(self):
+        """ test the integer ids of the nodes and edges and the n-hop keys """
+        rmap = raw_map.RawMap.read("example0.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, precomputed_hops=2)
+        graph = data.graph
+
+        self.assertEqual([node.node_id for node in graph.nodes], list(range(len(graph.nodes))))
+        self.assertEqual([edge.edge_id for edge in graph.edges], list(range(len(graph.edges))))
+
+        # the keys consist of the edge ids and do not depend on the direction
+        n_hop_dict = data.shortest_path._n_hop_dict
+        for node in graph.nodes:
+            for edge in node.directional_edges():
+                for next_edge in edge.end().directional_edges():
+                    reversed_edges = [type(e)(e._graph_edge, not e._a_to_b)
+                                      for e in (next_edge, edge)]
+                    key = n_hop_dict.create_key([edge, next_edge])
+                    self.assertEqual(set(key), {edge.edge_id, next_edge.edge_id})
+                    self.assertEqual(key, n_hop_dict.create_key(reversed_edges))
+                    self.assertLessEqual(key[0], key[-1])
+
+        # directional edges can be compared with other objects
+        edge = graph.nodes[0].directional_edges()[0]
+        self.assertNotEqual(edge, None)
+        self.assertNotIn(edge, [None, edge.edge_id])
+
+    def test_workers(self):
+        """ test if the preprocessing with worker processes gives the same result """
+        self.assertEqual(pf_parallel.split_into_chunks(list(range(7)), 3), [[0, 1, 2], [3, 4], [5, 6]])
+        self.assertEqual(pf_parallel.split_into_chunks([1, 2], 5), [[1], [2]])
+        self.assertEqual(pf_parallel.map_chunks(lambda shared, chunk: [shared * x for x in chunk], 2,
+                                                [[1, 2], [3], [4, 5]], workers=2), [[2, 4], [6], [8, 10]])
+
+        rmap = raw_map.RawMap.read("example1.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, workers=3)
+        self.assertEqual(data.graph.workers, 3)
+        opt_paths = [edge._opt_path for edge in data.graph.edges]
+
+        # optimise the edges of the same graph serially
+        data.graph.workers = 1
+        data.graph._optimise_edge_paths()
+        self.assertEqual([edge._opt_path for edge in data.graph.edges], opt_paths)
+
+        # the dictionary built by the workers is the same as the serial one (including the order)
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, precomputed_hops=2)
+        n_hop_dict = data.shortest_path._n_hop_dict
+        n_hop_dict_parallel = pf_shortest_path.NHopDictionary(data.graph, data.area_map, 2, workers=3)
+        self.assertEqual(list(n_hop_dict_parallel._map_opt_path.items()), list(n_hop_dict._map_opt_path.items()))
+        self.assertEqual(list(n_hop_dict_parallel._map_length.items()), list(n_hop_dict._map_length.items()))
+
+        # the iterations of optimise_path_loose_ends in the workers are counted
+        counts = []
+        for workers in [1, 3]:
+            data.area_map.loose_ends_iterations = collections.Counter()
+            pf_shortest_path.NHopDictionary(data.graph, data.area_map, 2, workers=workers)
+            counts.append(data.area_map.loose_ends_iterations)
+        self.assertGreater(sum(counts[0].values()), 0)
+        self.assertEqual(counts[1], counts[0])
+
+    def test_set_n(self):
+        """ test if changing n in place gives the same dictionary as a new build """
+        rmap = raw_map.RawMap.read("example1.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255)
+        graph, amap = data.graph, data.area_map
+
+        references = {n: pf_shortest_path.NHopDictionary(graph, amap, n) for n in [1, 2]}
+        for workers, ns in [(1, [2, 1]), (2, [2])]:
+            search = pf_shortest_path.ShortestPathSearch(graph, amap, 1, workers=workers)
+            for n in ns:
+                search.set_n(n)
+                self.assertEqual(search.n, n)
+                self.assertEqual(search._n_hop_dict.n, n)
+
+                self.assertEqual(list(search._n_hop_dict._map_opt_path.items()),
+                                 list(references[n]._map_opt_path.items()))
+                self.assertEqual(list(search._n_hop_dict._map_length.items()),
+                                 list(references[n]._map_length.items()))
+
+        # the search uses the new n (the end node is connected to the start node)
+        start = graph.edges[0].node_a
+        end = graph.edges[0].node_b.edges[-1].node_b
+        self.assertEqual(search.find_path_between_nodes(start, end).length(),
+                         pf_shortest_path.ShortestPathSearch(graph, amap, 2).find_path_between_nodes(start, end).length())
+
+    def test_lazy(self):
+        """ test if the lazy dictionary gives the same entries as the full build """
+        rmap = raw_map.RawMap.read("example1.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255)
+        graph, amap = data.graph, data.area_map
+
+        reference = pf_shortest_path.NHopDictionary(graph, amap, 2)
+        keys = list(reference._map_length)
+        random.Random(0).shuffle(keys)
+        for cache_size in [None, 5]:
+            n_hop_dict = pf_shortest_path.NHopDictionary(graph, amap, 2, lazy=True, cache_size=cache_size)
+            self.assertEqual(len(n_hop_dict._map_length), 0)
+            for key in keys:
+                edges = n_hop_dict._first_walk(key)
+                self.assertEqual(n_hop_dict.create_key(edges), key)
+                self.assertEqual(n_hop_dict.length_estimation(edges), reference.length_estimation(edges))
+                self.assertEqual(n_hop_dict.optimal_path(edges), reference.optimal_path(edges))
+                self.assertLessEqual(len(n_hop_dict._map_opt_path), cache_size or len(keys))
+            if cache_size is None:
+                self.assertEqual(n_hop_dict.query_counts, collections.Counter(keys * 2))
+            else:
+                # the counts are dropped with the entries
+                self.assertLessEqual(set(n_hop_dict.query_counts), set(n_hop_dict._map_opt_path))
+            self.assertGreaterEqual(n_hop_dict.misses, len(keys))
+            self.assertEqual(n_hop_dict.evictions, n_hop_dict.misses - len(n_hop_dict._map_opt_path))
+
+        # warm up a new dictionary with the most frequent keys
+        n_hop_dict.query_counts[keys[-1]] += 1
+        self.assertEqual(n_hop_dict.most_frequent_keys(1), [keys[-1]])
+        warm_n_hop_dict = pf_shortest_path.NHopDictionary(graph, amap, 2, lazy=True)
+        warm_n_hop_dict.warm_up(n_hop_dict.most_frequent_keys(3))
+        self.assertEqual(len(warm_n_hop_dict.query_counts), 0)
+        self.assertTrue(set(n_hop_dict.most_frequent_keys(3)) <= set(warm_n_hop_dict._map_opt_path))
+
+        # the search gives the same result
+        start = graph.edges[0].node_a
+        end = graph.edges[0].node_b.edges[-1].node_b
+        search = pf_shortest_path.ShortestPathSearch(graph, amap, 2, lazy=True, cache_size=10)
+        self.assertEqual(search.find_path_between_nodes(start, end).length(),
+                         pf_shortest_path.ShortestPathSearch(graph, amap, 2).find_path_between_nodes(start, end).length())
+        self.assertGreater(search._n_hop_dict.hits + search._n_hop_dict.misses, 0)
+
+    def test_gates(self):
+        """ test if the gates are the same as the ones of the reference search """
+        for path in ["example1.pgm", "example3.pgm"]:
+            data = pf_data.PathFindingData(raw_map.RawMap.read(path), lambda x: x == 255)
+            imap = data.influence_map
+            for node in data.graph.nodes:
+                d_edges = node.sorted_directional_edges()
+                if len(d_edges) <= 1:
+                    continue
+                for d_edge_a, d_edge_b in zip(d_edges, d_edges[1:] + d_edges[:1]):
+                    args = (node.position, d_edge_a.path(), d_edge_b.path())
+                    self.assertEqual(imap.nearest_area_grid_point_in_sector(*args),
+                                     imap.nearest_area_grid_point_in_sector_slow(*args))
+
+    def test_optimise_path(self):
+        """ test if the single pass optimisation gives the same length as the iterative one """
+        rmap = raw_map.RawMap.read("example1.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255)
+        amap = data.area_map
+
+        for edge in data.graph.edges:
+            for path in (edge._path.toPathF(), edge._path.toPathF().reversed()):
+                opt_path = amap.optimise_path(path)
+                expected = amap.optimise_path_iterative(path)
+                self.assertAlmostEqual(opt_path.length(), expected.length())
+                self.assertEqual(opt_path.start(), path.start())
+                self.assertEqual(opt_path.end(), path.end())
+
+    def test_extend_optimised_path(self):
+        """ test if extending an optimised path gives the same as optimising the whole path """
+        rmap = raw_map.RawMap.read("example1.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255)
+        amap = data.area_map
+
+        rng = random.Random(0)
+        for _ in range(20):
+            # random walk along the graph
+            node = rng.choice(data.graph.nodes)
+            edges = []
+            for _ in range(rng.randint(1, 8)):
+                edge = rng.choice(node.directional_edges())
+                edges.append(edge)
+                node = edge.end()
+
+            path = vector.PathF(sum([edge.opt_path().points for edge in edges], []))
+            expected = amap.optimise_path(path)
+
+            opt_path = amap.optimise_path(edges[0].opt_path())
+            for edge in edges[1:]:
+                opt_path = amap.extend_optimised_path(opt_path, edge.opt_path())
+            self.assertAlmostEqual(opt_path.length(), expected.length())
+            self.assertEqual(opt_path.start(), expected.start())
+            self.assertEqual(opt_path.end(), expected.end())
+
+    def test_stale_snapshot(self):
+        """ test if stale or damaged snapshots are rebuilt """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        rmap = raw_map.RawMap.read("example0.pgm")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=cache_dir)
+        path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+
+        # damage the payload
+        with open(path, "r+b") as f:
+            f.seek(-10, os.SEEK_END)
+            f.write(b"0123456789")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=cache_dir)
+        self.assertFalse(data.loaded_from_snapshot)
+
+        # a snapshot of another version
+        key = pf_snapshot.snapshot_key(rmap, data.pass_table, data.precomputed_hops)
+        self.assertIsNotNone(pf_snapshot.load_snapshot(path, key))
+        with open(path, "r+b") as f:
+            f.seek(len(pf_snapshot.SNAPSHOT_MAGIC))
+            f.write(struct.pack(">I", pf_snapshot.SNAPSHOT_VERSION + 1))
+        self.assertIsNone(pf_snapshot.load_snapshot(path, key))
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=cache_dir)
+        self.assertFalse(data.loaded_from_snapshot)
+        self.assertIsNotNone(pf_snapshot.load_snapshot(path, key))
+
+    def test_snapshot_directory(self):
+        """ test if the cache directory is created and if a failed save is ignored """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        rmap = raw_map.RawMap.read("example0.pgm")
+
+        # the directory does not exist yet
+        new_dir = os.path.join(cache_dir, "a", "b")
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=new_dir)
+        self.assertEqual(len(os.listdir(new_dir)), 1)
+
+        # the directory can not be created (a file is in the way)
+        file_path = os.path.join(cache_dir, "file")
+        open(file_path, "w").close()
+        data = pf_data.PathFindingData(rmap, lambda x: x == 255, cache_dir=os.path.join(file_path, "c"))
+        self.assertFalse(data.loaded_from_snapshot)
+        self.assertIsNotNone(data.shortest_path)
 
 
 class TestShortestPath(unittest.TestCase):
@@ -519,6 +1271,45 @@ class TestShortestPath(unittest.TestCase):
         expected = [1, 2]
         self.helper_test(nodes, get_edges, exact_eval, range_eval, start, end, expected)
 
+    def test_random_graphs(self):
+        """ test if the algorithm finds the shortest paths in random weighted graphs """
+        rng = random.Random(1)
+
+        for _ in range(20):
+            nodes = list(range(12))
+            weights = {}
+            for a in nodes:
+                for b in nodes:
+                    if a < b and rng.random() < 0.3:
+                        weights[(a, b)] = weights[(b, a)] = rng.choice([1, 2, 3, 5])
+            get_edges = self.get_edges_function(set(key for key in weights if key[0] < key[1]))
+
+            def exact_eval(path):
+                return sum(weights[(edge.start(), edge.end())] for edge in path.edges())
+
+            def range_eval(path):
+                e = exact_eval(path)
+                return (e, e)
+
+            # reference: Dijkstra's algorithm
+            start, end = 0, 11
+            distances = {start: 0}
+            queue = [(0, start)]
+            while queue:
+                d, node = heapq.heappop(queue)
+                for (a, b), w in weights.items():
+                    if a == node and d + w < distances.get(b, float("inf")):
+                        distances[b] = d + w
+                        heapq.heappush(queue, (d + w, b))
+
+            for estimator in [range_eval, lambda _: (0, float("inf"))]:
+                finder = shortest_path.ShortestPathFinder(nodes, get_edges, exact_eval, estimator)
+                path = finder.find_path(start, end)
+                if end not in distances:
+                    self.assertIsNone(path)
+                else:
+                    self.assertEqual(exact_eval(path), distances[end])
+
 
 if __name__ == '__main__':
     unittest.main()